@@ -0,0 +1,303 @@
+# Arquivo: benchmarks/benchmark_fases.py
+# Mede o tempo e a memória (RSS) de cada fase do rateio e da atualização, grava o resultado
+# em JSON e compara com uma execução anterior (ex.: o commit de antes de uma otimização).
+#
+# Exemplos (a partir da pasta do projeto):
+#   python -m benchmarks.benchmark_fases 100k
+#   python -m benchmarks.benchmark_fases "Motorola - Planilha de Controle.xlsm" --repeticoes 1
+#   python -m benchmarks.benchmark_fases 100k --comparar benchmarks/resultados/<anterior>.json
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+from datetime import datetime
+
+import pandas as pd
+
+from core.leitura_planilha import carregar_config, carregar_planilha
+from core.processamento_rateio import (
+    agregar_radios, consolidar_e_calcular_rateio, especificacao_rateio, processar_baterias, processar_budget,
+    processar_corte_fevereiro, processar_generic, processar_sumario_radios,
+)
+from core.atualizacao_massiva import atualizar_controles, especificacao_atualizacao, salvar_controles
+from core.exportacao import FORMATOS, exportar, formato_configurado
+from core.instrumentacao import rss_atual
+from benchmarks.gerar_planilha import adicionar_argumentos, gerar_planilha, interpretar_tamanho, parametros_dos_argumentos
+
+PASTA_PLANILHAS = os.path.join('benchmarks', 'planilhas')
+PASTA_RESULTADOS = os.path.join('benchmarks', 'resultados')
+MB = 1024 * 1024
+
+
+class ProgressoSilencioso:
+    """Mesma interface emit() do Signal do Qt, sem escrever nada (o log atrapalharia a medição)."""
+
+    def emit(self, message):
+        pass
+
+
+def pico_rss_processo():
+    """Maior RSS do processo desde o início, em bytes (None se o sistema não informar)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS, em bytes
+    return pico if sys.platform == 'darwin' else pico * 1024
+
+
+class MonitorMemoria:
+    """
+    Amostra o RSS em uma thread enquanto uma fase roda, para obter o pico de cada fase
+    (o pico do sistema operacional é do processo inteiro e não pode ser zerado entre fases).
+    """
+
+    def __init__(self, intervalo=0.005):
+        self.intervalo = intervalo
+        self.pico = None
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            rss = rss_atual()
+            if rss is not None and (self.pico is None or rss > self.pico):
+                self.pico = rss
+
+    def iniciar(self):
+        self.pico = rss_atual()
+        inicial = self.pico
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+        self._thread.start()
+        return inicial
+
+    def finalizar(self):
+        self._parar.set()
+        self._thread.join()
+        rss = rss_atual()
+        if rss is not None and (self.pico is None or rss > self.pico):
+            self.pico = rss
+        return self.pico
+
+
+def _linhas(resultado):
+    """Linhas de um DataFrame ou da soma dos DataFrames de um dicionário."""
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        return sum(len(df) for df in resultado.values() if isinstance(df, pd.DataFrame))
+    return None
+
+
+def medir_fase(nome, funcao, preparar, repeticoes, resultados):
+    """
+    Executa a fase `repeticoes` vezes. `preparar` devolve os argumentos de cada execução
+    (cópias, para fases que alteram a entrada) e não entra na medição.
+    Guarda tempos e memória em `resultados[nome]` e devolve o resultado da última execução.
+    """
+    tempos, picos, acrescimos = [], [], []
+    monitor = MonitorMemoria()
+    for _ in range(repeticoes):
+        argumentos = preparar()
+        linhas_entrada = sum(n for n in (_linhas(argumento) for argumento in argumentos) if n is not None)
+        gc.collect()
+        inicial = monitor.iniciar()
+        inicio = time.perf_counter()
+        resultado = funcao(*argumentos)
+        tempos.append(time.perf_counter() - inicio)
+        pico = monitor.finalizar()
+        if pico is not None:
+            picos.append(pico / MB)
+            acrescimos.append((pico - inicial) / MB)
+        del argumentos
+    resultados[nome] = {
+        'segundos': statistics.median(tempos),
+        'segundos_min': min(tempos),
+        'execucoes': [round(t, 4) for t in tempos],
+        'linhas_entrada': linhas_entrada,
+        'linhas_saida': _linhas(resultado),
+        'pico_rss_mb': round(max(picos), 1) if picos else None,
+        'acrescimo_rss_mb': round(max(acrescimos), 1) if acrescimos else None,
+    }
+    print(f"   {nome:<40} {resultados[nome]['segundos']:>9.3f} s", flush=True)
+    return resultado
+
+
+def fases_rateio(file_path, config, formato, pasta_saida, repeticoes, fases):
+    """Carga e cada etapa do rateio, na ordem do pipeline. Devolve as linhas lidas de cada aba."""
+    especificacao = especificacao_rateio(config)
+    dados = medir_fase('rateio.carga', carregar_planilha, lambda: (file_path, especificacao), repeticoes, fases)
+    radios, componentes, budget = dados['radios'], dados['componentes'], dados['budget']
+
+    # Etapa usada pelo pipeline normal (sumário, corte, ressarcimentos e instalações de rádios juntos)
+    agregados = medir_fase('rateio.agregar_radios', agregar_radios, lambda: (radios,), repeticoes, fases)
+    # As mesmas etapas em separado, como no modo streaming; alteram a entrada, então recebem cópias
+    medir_fase('rateio.processar_sumario_radios', processar_sumario_radios, lambda: (radios.copy(),), repeticoes, fases)
+    medir_fase('rateio.processar_corte_fevereiro', processar_corte_fevereiro, lambda: (radios.copy(),), repeticoes, fases)
+    medir_fase('rateio.processar_generic_radios', processar_generic,
+               lambda: (radios.copy(), 'Ressarcimento', 'Ressarcimento_Radios'), repeticoes, fases)
+    agregados['baterias'] = medir_fase('rateio.processar_baterias', processar_baterias, lambda: (componentes,), repeticoes, fases)
+    agregados['budget'] = medir_fase('rateio.processar_budget', processar_budget, lambda: (budget,), repeticoes, fases)
+    agregados['ressarc_comp'] = medir_fase(
+        'rateio.processar_generic_componentes', processar_generic,
+        lambda: (componentes.copy(), 'Ressarcimento', 'Ressarcimento_Componentes'), repeticoes, fases,
+    )
+    # Os merges de todos os agregados e as fórmulas do rateio
+    df_rateio = medir_fase('rateio.consolidar_e_calcular_rateio', consolidar_e_calcular_rateio, lambda: (agregados,), repeticoes, fases)
+    caminho = os.path.join(pasta_saida, f"Rateio{FORMATOS[formato]}")
+    medir_fase('rateio.exportacao', exportar, lambda: ({'Rateio': df_rateio}, caminho, formato), repeticoes, fases)
+    return {espec['aba']: len(dados[chave]) for chave, espec in especificacao.items()}
+
+
+def fases_atualizacao(file_path, config, formato, pasta_saida, repeticoes, fases):
+    """Carga, merge com a 'Base de Dados' e gravação da atualização. Devolve as linhas lidas de cada aba."""
+    especificacao = especificacao_atualizacao(config)
+    dados = medir_fase('atualizacao.carga', carregar_planilha, lambda: (file_path, especificacao), repeticoes, fases)
+    atualizadas = medir_fase('atualizacao.merge', atualizar_controles,
+                             lambda: (dados, config, ProgressoSilencioso()), repeticoes, fases)
+    caminho = os.path.join(pasta_saida, f"Controle_Atualizado{FORMATOS[formato]}")
+    medir_fase('atualizacao.exportacao', salvar_controles, lambda: (atualizadas, caminho, formato), repeticoes, fases)
+    return {espec['aba']: len(dados[chave]) for chave, espec in especificacao.items()}
+
+
+def identificar_commit():
+    """Commit atual (abreviado) e se há alterações não commitadas. (None, None) fora de um repositório git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        alteracoes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout
+        return commit, bool(alteracoes.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def executar_benchmark(file_path, processos, repeticoes, formato, config):
+    """Roda as fases pedidas e devolve o resultado no formato gravado em JSON."""
+    commit, alteracoes_locais = identificar_commit()
+    fases, linhas = {}, {}
+    with tempfile.TemporaryDirectory() as pasta_saida:
+        if 'rateio' in processos:
+            print("--- Rateio ---", flush=True)
+            linhas.update(fases_rateio(file_path, config, formato, pasta_saida, repeticoes, fases))
+        if 'atualizacao' in processos:
+            print("--- Atualização Massiva ---", flush=True)
+            linhas.update(fases_atualizacao(file_path, config, formato, pasta_saida, repeticoes, fases))
+    pico = pico_rss_processo()
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'alteracoes_locais': alteracoes_locais,
+        'ambiente': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'sistema': platform.platform(),
+            'processadores': os.cpu_count(),
+        },
+        'planilha': {'arquivo': os.path.basename(file_path), 'linhas': linhas},
+        'repeticoes': repeticoes,
+        'formato_saida': formato,
+        'fases': fases,
+        'pico_rss_processo_mb': round(pico / MB, 1) if pico is not None else None,
+    }
+
+
+def comparar(atual, anterior, limite_tempo, limite_memoria, minimo_segundos, minimo_mb):
+    """
+    Imprime a variação de cada fase em relação a `anterior` e devolve as regressões:
+    fases mais lentas (ou com mais memória) que o limite percentual. Diferenças abaixo de
+    `minimo_segundos` / `minimo_mb` são tratadas como ruído de medição.
+    """
+    linhas_anteriores = anterior['planilha']['linhas']
+    if any(aba in linhas_anteriores and linhas_anteriores[aba] != n for aba, n in atual['planilha']['linhas'].items()):
+        print("AVISO: as planilhas comparadas têm tamanhos diferentes; as variações não são comparáveis.")
+    print(f"\nComparação com {anterior.get('commit') or '?'} ({anterior.get('data', '?')}):")
+    print(f"   {'fase':<40} {'antes':>9} {'agora':>9} {'var.':>8}   {'mem. antes':>10} {'agora':>9}")
+    regressoes = []
+    for nome, fase in atual['fases'].items():
+        base = anterior['fases'].get(nome)
+        if base is None:
+            print(f"   {nome:<40} {'-':>9} {fase['segundos']:>9.3f}   (fase nova)")
+            continue
+        variacao = (fase['segundos'] / base['segundos'] - 1) * 100 if base['segundos'] else 0.0
+        mem_antes, mem_agora = base.get('acrescimo_rss_mb'), fase.get('acrescimo_rss_mb')
+        texto_mem = f"{mem_antes:>8.1f}MB {mem_agora:>7.1f}MB" if mem_antes is not None and mem_agora is not None else ''
+        print(f"   {nome:<40} {base['segundos']:>9.3f} {fase['segundos']:>9.3f} {variacao:>+7.1f}%   {texto_mem}")
+        if fase['segundos'] - base['segundos'] >= minimo_segundos and variacao > limite_tempo:
+            regressoes.append(f"{nome}: tempo {base['segundos']:.3f} s -> {fase['segundos']:.3f} s ({variacao:+.1f}%)")
+        if mem_antes is not None and mem_agora is not None and mem_agora - mem_antes >= minimo_mb:
+            variacao_mem = (mem_agora / mem_antes - 1) * 100 if mem_antes > 0 else float('inf')
+            if variacao_mem > limite_memoria:
+                regressoes.append(f"{nome}: memória {mem_antes:.1f} MB -> {mem_agora:.1f} MB ({variacao_mem:+.1f}%)")
+    return regressoes
+
+
+def resolver_planilha(entrada, args):
+    """Usa o arquivo informado ou, para um tamanho (ex.: 100k), gera a planilha sintética (reaproveitada se já existir)."""
+    if os.path.isfile(entrada):
+        return entrada
+    linhas = interpretar_tamanho(entrada)
+    parametros = parametros_dos_argumentos(args)
+    # As datas terminam no mês atual, então o mês entra no nome
+    nome = (f"sintetica_{linhas}_g{args.gerencias}_c{args.centros_por_gerencia}_e{args.eventos_por_radio:g}"
+            f"_m{args.meses}_s{args.semente}_{datetime.now():%Y-%m}.xlsm")
+    caminho = os.path.join(PASTA_PLANILHAS, nome)
+    if not os.path.exists(caminho):
+        print(f"Gerando planilha sintética com {linhas} linhas: {caminho}", flush=True)
+        gerar_planilha(caminho, linhas, **parametros)
+    return caminho
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede cada fase do rateio e da atualização e compara com execuções anteriores.")
+    parser.add_argument('planilha', help="Planilha de controle ou tamanho da planilha sintética (ex.: 10k, 100k, 1M).")
+    parser.add_argument('--processo', choices=['rateio', 'atualizacao', 'ambos'], default='ambos')
+    parser.add_argument('--repeticoes', type=int, default=3, help="Execuções de cada fase; vale a mediana (padrão: 3).")
+    parser.add_argument('--formato', choices=list(FORMATOS), help="Formato da exportação (padrão: o do config.ini).")
+    parser.add_argument('--saida', help="Arquivo JSON do resultado (padrão: benchmarks/resultados/<data>_<commit>.json).")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparar.")
+    parser.add_argument('--limite-tempo', type=float, default=10.0, help="Regressão de tempo tolerada, em %% (padrão: 10).")
+    parser.add_argument('--limite-memoria', type=float, default=15.0, help="Regressão de memória tolerada, em %% (padrão: 15).")
+    parser.add_argument('--minimo-segundos', type=float, default=0.05, help="Diferença de tempo ignorada como ruído (padrão: 0,05 s).")
+    parser.add_argument('--minimo-mb', type=float, default=10.0, help="Diferença de memória ignorada como ruído (padrão: 10 MB).")
+    adicionar_argumentos(parser)
+    args = parser.parse_args(argv)
+    if args.repeticoes < 1:
+        parser.error("--repeticoes deve ser pelo menos 1.")
+
+    config = carregar_config()
+    file_path = resolver_planilha(args.planilha, args)
+    processos = ['rateio', 'atualizacao'] if args.processo == 'ambos' else [args.processo]
+    resultado = executar_benchmark(file_path, processos, args.repeticoes, args.formato or formato_configurado(config), config)
+
+    saida = args.saida
+    if saida is None:
+        saida = os.path.join(PASTA_RESULTADOS, f"{datetime.now():%Y-%m-%d_%H-%M-%S}_{resultado['commit'] or 'sem-git'}.json")
+    os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"\nPico de RSS do processo: {resultado['pico_rss_processo_mb']} MB")
+    print(f"Resultado gravado em: {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)
+        regressoes = comparar(resultado, anterior, args.limite_tempo, args.limite_memoria, args.minimo_segundos, args.minimo_mb)
+        if regressoes:
+            print(f"\nREGRESSÃO em {len(regressoes)} medição(ões):")
+            for regressao in regressoes:
+                print(f"   - {regressao}")
+            return 1
+        print("\nSem regressões acima dos limites.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
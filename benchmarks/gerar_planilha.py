@@ -0,0 +1,209 @@
+# Arquivo: benchmarks/gerar_planilha.py
+# Gera planilhas de controle sintéticas, com as quatro abas e as colunas do config.ini,
+# para medir o desempenho do rateio e da atualização em tamanhos controlados.
+#
+# Exemplos (a partir da pasta do projeto):
+#   python -m benchmarks.gerar_planilha 100k
+#   python -m benchmarks.gerar_planilha 1M --gerencias 200 --meses 48 --saida planilha_1M.xlsm
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+from core.leitura_planilha import carregar_config
+
+SUFIXOS_TAMANHO = {'k': 1_000, 'm': 1_000_000}
+# Distribuição aproximada das atividades nas abas de controle reais
+ATIVIDADES_RADIOS = {'Entrega': 0.45, 'Devolução': 0.20, 'Ressarcimento': 0.15, 'Instalação': 0.20}
+ATIVIDADES_COMPONENTES = {'Entrega': 0.50, 'Devolução': 0.30, 'Ressarcimento': 0.20}
+EQUIPAMENTOS = {'Bateria': 0.55, 'Antena': 0.25, 'Carregador': 0.15, 'Clip': 0.05}
+MODELOS = ['DEP450', 'DEP250', 'DGP8550', 'APX900', 'SL500']
+PREFIXOS_GERENCIA = ['Manutenção', 'Operação', 'Logística', 'Segurança', 'Produção', 'Engenharia', 'Suprimentos', 'Mineração']
+
+
+def interpretar_tamanho(texto):
+    """'10k' -> 10000, '1M' -> 1000000, '2500' -> 2500."""
+    texto = str(texto).strip().lower().replace('_', '')
+    multiplicador = SUFIXOS_TAMANHO.get(texto[-1:], 1)
+    if multiplicador != 1:
+        texto = texto[:-1]
+    try:
+        linhas = int(float(texto) * multiplicador)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Tamanho inválido: '{texto}'. Use, por exemplo, 10k, 100k ou 1M.")
+    if linhas <= 0:
+        raise argparse.ArgumentTypeError("O número de linhas deve ser positivo.")
+    return linhas
+
+
+def _escolher(rng, opcoes, n):
+    """Amostra n valores de {valor: probabilidade}."""
+    valores = list(opcoes)
+    pesos = np.array(list(opcoes.values()), dtype=float)
+    return np.array(valores, dtype=object)[rng.choice(len(valores), size=n, p=pesos / pesos.sum())]
+
+
+def _com_vazios(rng, valores, proporcao):
+    """Troca uma fração dos valores por None (células em branco)."""
+    valores = np.asarray(valores, dtype=object)
+    if proporcao > 0:
+        valores[rng.random(len(valores)) < proporcao] = None
+    return valores
+
+
+def _datas(rng, n, meses, fim):
+    """Datas espalhadas nos últimos `meses` meses até `fim`; parte delas à meia-noite (só a data)."""
+    inicio = fim - pd.DateOffset(months=meses)
+    segundos = rng.integers(0, int((fim - inicio).total_seconds()), size=n)
+    datas = inicio + pd.to_timedelta(segundos, unit='s')
+    so_data = rng.random(n) < 0.6
+    datas = datas.where(~so_data, datas.normalize())
+    return datas.floor('s').to_pydatetime()
+
+
+def montar_abas(config, linhas, gerencias=40, centros_por_gerencia=3, eventos_por_radio=4.0, meses=36,
+                proporcao_componentes=0.5, proporcao_budget=0.05, proporcao_vazios=0.01,
+                proporcao_sem_cadastro=0.02, semente=42):
+    """
+    Monta as quatro abas como {nome da aba: DataFrame}.
+    `linhas` é o tamanho da 'Controle de Radios' (a maior); as demais são proporcionais.
+    A cardinalidade das chaves vem de `gerencias`, `centros_por_gerencia` e `eventos_por_radio`
+    (linhas por ID de rádio); `meses` é o intervalo das datas, terminando no mês atual.
+    """
+    rng = np.random.default_rng(semente)
+    abas = config['Abas']
+    colunas_base = config['Colunas_Base_Dados']
+    fim = pd.Timestamp.now().normalize() + pd.offsets.MonthEnd(0)
+
+    nomes = np.array([f"{PREFIXOS_GERENCIA[i % len(PREFIXOS_GERENCIA)]} {i // len(PREFIXOS_GERENCIA) + 1:02d}" for i in range(gerencias)], dtype=object)
+    centros = {nome: [f"CC{1000 + i * centros_por_gerencia + j}" for j in range(centros_por_gerencia)] for i, nome in enumerate(nomes)}
+    # Parte das gerências dos controles não tem cadastro na 'Base de Dados'
+    sem_cadastro = max(1, int(round(gerencias * proporcao_sem_cadastro))) if proporcao_sem_cadastro > 0 else 0
+    cadastradas = nomes[:gerencias - sem_cadastro]
+
+    df_base = pd.DataFrame({
+        colunas_base['gerencia']: cadastradas,
+        colunas_base['centro_custo']: [centros[nome][0] for nome in cadastradas],
+        colunas_base['area']: [f"Área {nome.split()[0]}" for nome in cadastradas],
+        colunas_base['gestor']: [f"Gestor {i + 1:03d}" for i in range(len(cadastradas))],
+    })
+
+    def gerencias_e_centros(n):
+        escolhidas = nomes[rng.integers(0, gerencias, size=n)]
+        indices_cc = rng.integers(0, centros_por_gerencia, size=n)
+        cc = np.array([centros[g][i] for g, i in zip(escolhidas, indices_cc)], dtype=object)
+        # Grafias diferentes da mesma gerência (a atualização normaliza, o rateio não)
+        variantes = rng.random(n) < 0.05
+        escolhidas = escolhidas.copy()
+        escolhidas[variantes] = [g.upper() for g in escolhidas[variantes]]
+        return escolhidas, cc
+
+    total_radios = max(1, int(linhas / eventos_por_radio))
+    gerencia, cc = gerencias_e_centros(linhas)
+    df_radios = pd.DataFrame({
+        'ID do rádio': _com_vazios(rng, [f"R{i:07d}" for i in rng.integers(0, total_radios, size=linhas)], proporcao_vazios),
+        'Modelo': np.array(MODELOS, dtype=object)[rng.integers(0, len(MODELOS), size=linhas)],
+        'Gerência': gerencia,
+        'Centro de custo': _com_vazios(rng, cc, proporcao_vazios),
+        'Gerente': [f"Gerente {i:03d}" for i in rng.integers(0, gerencias * 2, size=linhas)],
+        'Atividade': _escolher(rng, ATIVIDADES_RADIOS, linhas),
+        'Data': _com_vazios(rng, _datas(rng, linhas, meses, fim), proporcao_vazios),
+        'Valor': np.round(rng.uniform(150, 4500, size=linhas), 2),
+        'Observação': _com_vazios(rng, np.full(linhas, 'Conferido', dtype=object), 0.7),
+    })
+
+    n_componentes = max(1, int(linhas * proporcao_componentes))
+    gerencia, cc = gerencias_e_centros(n_componentes)
+    df_componentes = pd.DataFrame({
+        'Gerência': gerencia,
+        'Centro de custo': cc,
+        'Gerente': [f"Gerente {i:03d}" for i in rng.integers(0, gerencias * 2, size=n_componentes)],
+        'Equipamento': _escolher(rng, EQUIPAMENTOS, n_componentes),
+        'Atividade': _escolher(rng, ATIVIDADES_COMPONENTES, n_componentes),
+        'Quantidade': rng.integers(1, 11, size=n_componentes),
+        'Valor': np.round(rng.uniform(20, 600, size=n_componentes), 2),
+        'Data': _datas(rng, n_componentes, meses, fim),
+    })
+
+    n_budget = max(1, int(linhas * proporcao_budget))
+    df_budget = pd.DataFrame({
+        'Gerencia Padronizada': nomes[rng.integers(0, gerencias, size=n_budget)],
+        'Valor': np.round(rng.uniform(150, 4500, size=n_budget), 2),
+        'Solicitante': [f"Solicitante {i:04d}" for i in rng.integers(0, 500, size=n_budget)],
+    })
+
+    return {
+        abas['base_dados']: df_base,
+        abas['controle_radios']: df_radios,
+        abas['controle_componentes']: df_componentes,
+        abas['controle_solicitacoes']: df_budget,
+    }
+
+
+def gravar_planilha(abas, caminho):
+    """
+    Grava as abas linha a linha (xlsxwriter em modo constant_memory: o writer não guarda a
+    planilha inteira). Um .xlsm sai sem macros, com a mesma estrutura interna do .xlsx;
+    os leitores do projeto (openpyxl) o abrem normalmente.
+    """
+    import xlsxwriter
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True, 'default_date_format': 'dd/mm/yyyy hh:mm:ss'})
+    try:
+        for nome_aba, df in abas.items():
+            worksheet = workbook.add_worksheet(nome_aba)
+            worksheet.write_row(0, 0, list(df.columns))
+            # Vazios (None, NaN, NaT) viram células em branco
+            colunas = [df[coluna].astype(object).where(df[coluna].notna(), None).tolist() for coluna in df.columns]
+            for linha, valores in enumerate(zip(*colunas), 1):
+                worksheet.write_row(linha, 0, valores)
+    finally:
+        workbook.close()
+    return caminho
+
+
+def gerar_planilha(caminho, linhas, config=None, **parametros):
+    """Monta e grava a planilha sintética. Retorna {nome da aba: número de linhas}."""
+    config = config or carregar_config()
+    abas = montar_abas(config, linhas, **parametros)
+    gravar_planilha(abas, caminho)
+    return {nome_aba: len(df) for nome_aba, df in abas.items()}
+
+
+def adicionar_argumentos(parser):
+    """Parâmetros do gerador, compartilhados com o benchmark."""
+    parser.add_argument('--gerencias', type=int, default=40, help="Gerências distintas (padrão: 40).")
+    parser.add_argument('--centros-por-gerencia', type=int, default=3, help="Centros de custo por gerência (padrão: 3).")
+    parser.add_argument('--eventos-por-radio', type=float, default=4.0, help="Linhas por ID de rádio, em média (padrão: 4).")
+    parser.add_argument('--meses', type=int, default=36, help="Intervalo das datas em meses, até o mês atual (padrão: 36).")
+    parser.add_argument('--semente', type=int, default=42, help="Semente do gerador aleatório (padrão: 42).")
+
+
+def parametros_dos_argumentos(args):
+    return {
+        'gerencias': args.gerencias,
+        'centros_por_gerencia': args.centros_por_gerencia,
+        'eventos_por_radio': args.eventos_por_radio,
+        'meses': args.meses,
+        'semente': args.semente,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera uma planilha de controle sintética para benchmarks.")
+    parser.add_argument('linhas', type=interpretar_tamanho, help="Linhas da 'Controle de Radios' (ex.: 10k, 100k, 1M).")
+    parser.add_argument('--saida', help="Arquivo gerado (.xlsx ou .xlsm). Padrão: benchmarks/planilhas/sintetica_<linhas>.xlsm")
+    adicionar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    saida = args.saida or os.path.join('benchmarks', 'planilhas', f"sintetica_{args.linhas}.xlsm")
+    tamanhos = gerar_planilha(saida, args.linhas, **parametros_dos_argumentos(args))
+    for nome_aba, n in tamanhos.items():
+        print(f"   {nome_aba}: {n} linhas")
+    print(f"Planilha gerada: {saida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
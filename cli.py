@@ -0,0 +1,195 @@
+# Arquivo: cli.py
+# Ponto de entrada sem interface gráfica: processa uma ou várias planilhas em paralelo.
+# Não importa o Qt, então roda em servidores Linux sem ambiente gráfico.
+#
+# Exemplos:
+#   python cli.py rateio "Motorola - Planilha de Controle.xlsm"
+#   python cli.py atualizacao planilhas_regionais/ --workers 4 --saida Resultados
+#   python cli.py rateio "regionais/*.xlsm" --sem-cache
+#   python cli.py rateio "Motorola - Planilha de Controle.xlsm" --historico --mes 2025-01 --ate 2025-03
+import os
+import sys
+import csv
+import glob
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+EXTENSOES_PLANILHA = ('.xlsx', '.xlsm')
+
+
+class ProgressoConsole:
+    """Substitui o Signal do Qt: mesma interface emit(), escrevendo no terminal."""
+
+    def __init__(self, prefixo=""):
+        self.prefixo = prefixo
+        self.ultima_mensagem = ""
+
+    def emit(self, message):
+        for linha in str(message).splitlines():
+            if linha.strip():
+                self.ultima_mensagem = linha.strip()
+                print(f"{self.prefixo}{linha}", flush=True)
+
+
+def expandir_entradas(entradas):
+    """Aceita arquivos, pastas (todas as planilhas dentro) e padrões glob. Remove repetidos."""
+    arquivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = sorted(os.path.join(entrada, nome) for nome in os.listdir(entrada))
+        elif glob.has_magic(entrada):
+            candidatos = sorted(glob.glob(entrada))
+        else:
+            candidatos = [entrada]
+        for caminho in candidatos:
+            nome = os.path.basename(caminho)
+            # '~$' são arquivos de bloqueio que o Excel cria ao abrir uma planilha
+            if nome.startswith('~$') or not nome.lower().endswith(EXTENSOES_PLANILHA):
+                continue
+            caminho = os.path.abspath(caminho)
+            if caminho not in arquivos:
+                arquivos.append(caminho)
+    return arquivos
+
+
+def executar_tarefa(acao, file_path, arquivo_saida, opcoes):
+    """Executada em um processo do pool: roda o pipeline de uma planilha e devolve o resumo."""
+    if acao == 'rateio' and opcoes.get('historico'):
+        from core.historico import run_historical_process as funcao
+        opcoes = {chave: valor for chave, valor in opcoes.items() if chave != 'historico'}
+    elif acao == 'rateio':
+        from core.processamento_rateio import run_full_process as funcao
+    else:
+        from core.atualizacao_massiva import run_update_process as funcao
+    progresso = ProgressoConsole(prefixo=f"[{os.path.basename(file_path)}] ")
+    inicio = time.perf_counter()
+    # Os processos devolvem os arquivos realmente gravados (em csv/parquet, um por aba)
+    arquivos = funcao(file_path, progresso, arquivo_saida=arquivo_saida, **opcoes)
+    return {
+        'arquivo': file_path,
+        'acao': acao,
+        'sucesso': bool(arquivos),
+        'segundos': round(time.perf_counter() - inicio, 2),
+        'saida': ';'.join(arquivos) if arquivos else '',
+        'mensagem': progresso.ultima_mensagem,
+    }
+
+
+def caminho_saida(config, acao, file_path, timestamp, pasta_saida=None):
+    """
+    Um arquivo de resultado por planilha de entrada: o nome configurado em [Nomes_Arquivos_Saida]
+    (o mesmo da interface), com o nome da entrada. `pasta_saida` substitui a pasta configurada.
+    """
+    from core.exportacao import caminho_saida_padrao
+    base = os.path.splitext(os.path.basename(file_path))[0]
+    caminho = caminho_saida_padrao(config, acao, timestamp=timestamp, rotulo=base)
+    if pasta_saida is not None:
+        caminho = os.path.join(pasta_saida, os.path.basename(caminho))
+    return caminho
+
+
+def gravar_resumo(resultados, pasta_saida, acao, timestamp):
+    """Resumo consolidado do lote (uma linha por planilha), em CSV."""
+    os.makedirs(pasta_saida, exist_ok=True)
+    caminho = os.path.join(pasta_saida, f"Resumo_Lote_{acao}_{timestamp}.csv")
+    with open(caminho, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=['arquivo', 'acao', 'sucesso', 'segundos', 'saida', 'mensagem'], delimiter=';')
+        writer.writeheader()
+        writer.writerows(resultados)
+    return caminho
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="NEXUS - processamento de planilhas sem interface gráfica.")
+    parser.add_argument('acao', choices=['rateio', 'atualizacao'], help="Processo a executar em cada planilha.")
+    parser.add_argument('entradas', nargs='+', help="Planilhas, pastas ou padrões glob (ex.: 'regionais/*.xlsm').")
+    parser.add_argument('--saida', default=None, help="Pasta dos resultados (padrão: a mesma pasta de saída da interface).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Número de processos em paralelo.")
+    parser.add_argument('--sem-cache', action='store_true', help="Ignora o cache de planilhas já processadas.")
+    parser.add_argument('--streaming', action='store_true', help="Rateio em blocos, com memória constante.")
+    parser.add_argument('--incremental', action='store_true', help="Rateio recalculando só as gerências alteradas desde a última execução.")
+    parser.add_argument('--verificar', action='store_true', help="Com --incremental ou --historico, compara o resultado com o recálculo completo em memória.")
+    parser.add_argument('--mes', default=None, help="Rateio de outro mês (AAAA-MM) em vez do mês corrente.")
+    parser.add_argument('--ate', default=None, help="Com --mes, último mês de um intervalo (AAAA-MM).")
+    parser.add_argument('--corte', default=None, help="Data de corte (AAAA-MM-DD) no lugar de 2024-02-01.")
+    parser.add_argument('--historico', action='store_true', help="Com --mes, usa o histórico mensal em SQLite (cada planilha é ingerida uma única vez).")
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    arquivos = expandir_entradas(args.entradas)
+    if not arquivos:
+        print("Nenhuma planilha (.xlsx/.xlsm) encontrada nas entradas informadas.", file=sys.stderr)
+        return 2
+
+    opcoes = {'usar_cache': not args.sem_cache}
+    if args.acao == 'rateio' and args.historico:
+        if args.mes is None:
+            print("--historico exige o mês do rateio (--mes AAAA-MM).", file=sys.stderr)
+            return 2
+        opcoes.update({'historico': True, 'mes_inicial': args.mes, 'mes_final': args.ate,
+                       'data_corte': args.corte, 'verificar': args.verificar})
+    elif args.acao == 'rateio':
+        opcoes['modo_streaming'] = args.streaming
+        opcoes['incremental'] = args.incremental
+        opcoes['verificar_incremental'] = args.verificar
+        if args.mes is not None or args.ate is not None or args.corte is not None:
+            from core.processamento_rateio import periodo_rateio
+            try:
+                opcoes['periodo'] = periodo_rateio(args.mes, args.ate, args.corte)
+            except ValueError as e:
+                print(f"Período inválido: {e}", file=sys.stderr)
+                return 2
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    workers = max(1, min(args.workers, len(arquivos)))
+    if args.acao == 'rateio' and not args.historico and workers > 1:
+        # Com várias planilhas ao mesmo tempo os núcleos já estão ocupados: cada uma roda em sequência
+        opcoes['paralelo'] = False
+    print(f"Processando {len(arquivos)} planilha(s) com {workers} processo(s)...", flush=True)
+
+    # Nomes, pasta e formato de saída configurados (import tardio: o pandas só é carregado aqui)
+    from core.exportacao import FORMATOS, caminho_saida_padrao, formato_configurado
+    from core.leitura_planilha import carregar_config
+    config = carregar_config()
+    extensao = FORMATOS[formato_configurado(config)]
+    pasta_saida = args.saida or os.path.dirname(caminho_saida_padrao(config, args.acao, timestamp=timestamp)) or "."
+
+    saidas = {}
+    for arquivo in arquivos:
+        saida = caminho_saida(config, args.acao, arquivo, timestamp, args.saida)
+        # Planilhas com o mesmo nome vindas de pastas diferentes não podem sobrescrever umas às outras
+        base = os.path.splitext(saida)[0]
+        contador = 2
+        while saida in saidas.values():
+            saida = f"{base}_{contador}{extensao}"
+            contador += 1
+        saidas[arquivo] = saida
+
+    resultados = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {
+            pool.submit(executar_tarefa, args.acao, arquivo, saidas[arquivo], opcoes): arquivo
+            for arquivo in arquivos
+        }
+        for futuro in as_completed(futuros):
+            try:
+                resultados.append(futuro.result())
+            except Exception as e:
+                # Falha do próprio processo (ex.: falta de memória); as falhas de dados já vêm no resultado
+                resultados.append({'arquivo': futuros[futuro], 'acao': args.acao, 'sucesso': False,
+                                   'segundos': '', 'saida': '', 'mensagem': f"ERRO NO PROCESSO: {e}"})
+
+    resultados.sort(key=lambda r: arquivos.index(r['arquivo']))
+    resumo = gravar_resumo(resultados, pasta_saida, args.acao, timestamp)
+    falhas = [r for r in resultados if not r['sucesso']]
+    print(f"\nConcluído: {len(resultados) - len(falhas)} sucesso(s), {len(falhas)} falha(s). Resumo em '{resumo}'.")
+    for r in falhas:
+        print(f"   FALHA: {os.path.basename(r['arquivo'])}: {r['mensagem']}")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
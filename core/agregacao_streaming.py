@@ -0,0 +1,165 @@
+# Arquivo: core/agregacao_streaming.py
+# Modo streaming do rateio: percorre as abas em blocos (openpyxl iter_rows, somente leitura)
+# e mantém apenas acumuladores por chave. A memória fica limitada pelo número de rádios
+# e de centros de custo, não pelo número de linhas da planilha.
+import pandas as pd
+from openpyxl import load_workbook
+from core.leitura_planilha import ler_aba_em_blocos, validar_estrutura
+from core.instrumentacao import instrumentado
+from core.processamento_rateio import (
+    CHAVES_GRUPO, especificacao_rateio, processar_baterias, processar_corte_fevereiro, processar_sumario_radios,
+    renomear_generic,
+)
+
+TAMANHO_BLOCO_PADRAO = 50000
+COLUNAS_ESTADO_RADIO = ['ID do rádio', 'Gerência', 'Centro de custo', 'Atividade', 'Data', 'Valor', '_seq']
+
+
+def tamanho_bloco_configurado(config):
+    """Linhas por bloco, da seção [Streaming] do config.ini (com valor padrão)."""
+    if config.has_section('Streaming'):
+        return config['Streaming'].getint('tamanho_bloco', TAMANHO_BLOCO_PADRAO)
+    return TAMANHO_BLOCO_PADRAO
+
+
+def _normalizar_bloco(bloco, inicio_seq):
+    """A inferência de tipos é por bloco: datas e números são convertidos explicitamente."""
+    bloco['Data'] = pd.to_datetime(bloco['Data'])
+    for coluna in ('Valor', 'Quantidade'):
+        if coluna in bloco.columns:
+            bloco[coluna] = pd.to_numeric(bloco[coluna])
+    # Posição global da linha: desempata eventos com a mesma data (vence o que aparece depois)
+    bloco['_seq'] = range(inicio_seq, inicio_seq + len(bloco))
+    return bloco
+
+
+def _manter_ultimo(acumulado, novos):
+    """Último estado de cada rádio: maior Data (NaT por último, como em sort_values) e depois maior _seq."""
+    juntos = novos if acumulado is None else pd.concat([acumulado, novos], ignore_index=True)
+    juntos = juntos.sort_values(['Data', '_seq'], na_position='last', kind='stable')
+    return juntos.drop_duplicates(subset='ID do rádio', keep='last')
+
+
+def _somar(acumulado, parcial):
+    """Soma um agregado parcial ao acumulado (índices = chaves de grupo)."""
+    if parcial.empty:
+        return acumulado
+    if acumulado is None:
+        return parcial
+    return pd.concat([acumulado, parcial]).groupby(level=list(range(parcial.index.nlevels))).sum()
+
+
+def _agregar_radios(blocos, mes, progress_callback):
+    ultimo_todos = None
+    ultimo_valido = None
+    mensal = None
+    linhas = 0
+    for bloco in blocos:
+        bloco = _normalizar_bloco(bloco, linhas)
+        linhas += len(bloco)
+        estado = bloco[COLUNAS_ESTADO_RADIO]
+        ultimo_todos = _manter_ultimo(ultimo_todos, estado)
+        validas = estado[['ID do rádio', 'Gerência', 'Centro de custo']].notna().all(axis=1)
+        ultimo_valido = _manter_ultimo(ultimo_valido, estado[validas])
+
+        agg_dict = {'Valor': 'sum'}
+        if 'Quantidade' in bloco.columns:
+            agg_dict['Quantidade'] = 'sum'
+        else:
+            agg_dict['ID do rádio'] = 'count'
+        no_mes = bloco['Atividade'].isin(['Ressarcimento', 'Instalação']) & (bloco['Data'].dt.month == mes)
+        parcial = bloco[no_mes].groupby(CHAVES_GRUPO + ['Atividade']).agg(agg_dict)
+        mensal = _somar(mensal, parcial)
+        progress_callback.emit(f"   Rádios: {linhas} linhas lidas, {len(ultimo_todos)} rádios distintos.")
+
+    if ultimo_todos is None:
+        raise ValueError("A aba de rádios não contém linhas de dados.")
+    resultados = {
+        'sumario_radios': processar_sumario_radios(ultimo_valido.drop(columns='_seq')),
+        'corte_fevereiro': processar_corte_fevereiro(ultimo_todos.drop(columns='_seq')),
+    }
+    for atividade, chave, sufixo in [('Ressarcimento', 'ressarc_radios', 'Ressarcimento_Radios'),
+                                     ('Instalação', 'instal_radios', 'Instalacao_Radios')]:
+        if mensal is not None and atividade in mensal.index.get_level_values('Atividade'):
+            summary = mensal.xs(atividade, level='Atividade').reset_index()
+        else:
+            summary = pd.DataFrame(columns=CHAVES_GRUPO + ['Valor'])
+        resultados[chave] = renomear_generic(summary, sufixo)
+    return resultados
+
+
+def _agregar_componentes(blocos, mes, progress_callback):
+    baterias = None
+    ressarcimentos = None
+    linhas = 0
+    for bloco in blocos:
+        bloco = _normalizar_bloco(bloco, linhas)
+        linhas += len(bloco)
+        parcial = bloco[bloco['Equipamento'] == 'Bateria'].groupby(CHAVES_GRUPO + ['Atividade'])[['Quantidade', 'Valor']].sum()
+        baterias = _somar(baterias, parcial)
+        no_mes = (bloco['Atividade'] == 'Ressarcimento') & (bloco['Data'].dt.month == mes)
+        parcial = bloco[no_mes].groupby(CHAVES_GRUPO).agg({'Valor': 'sum', 'Quantidade': 'sum'})
+        ressarcimentos = _somar(ressarcimentos, parcial)
+        progress_callback.emit(f"   Componentes: {linhas} linhas lidas.")
+
+    if baterias is None:
+        df_baterias = pd.DataFrame(columns=CHAVES_GRUPO + ['Atividade', 'Quantidade', 'Valor', 'Equipamento'])
+    else:
+        # Uma linha por grupo já somado: o pivot de processar_baterias produz o mesmo formato
+        df_baterias = baterias.reset_index().assign(Equipamento='Bateria')
+    if ressarcimentos is None:
+        ressarcimentos = pd.DataFrame(columns=CHAVES_GRUPO + ['Valor', 'Quantidade']).set_index(CHAVES_GRUPO)
+    return {
+        'baterias': processar_baterias(df_baterias),
+        'ressarc_comp': renomear_generic(ressarcimentos.reset_index(), 'Ressarcimento_Componentes'),
+    }
+
+
+def _agregar_budget(blocos, progress_callback):
+    budget = None
+    linhas = 0
+    for bloco in blocos:
+        linhas += len(bloco)
+        bloco['Valor'] = pd.to_numeric(bloco['Valor'])
+        parcial = bloco.groupby('Gerencia Padronizada').agg(
+            Qtd_Radios_Budget=('Gerencia Padronizada', 'count'),
+            Valor_Radios_Budget=('Valor', 'sum')
+        )
+        budget = _somar(budget, parcial)
+        progress_callback.emit(f"   Budget: {linhas} linhas lidas.")
+    if budget is None:
+        return pd.DataFrame(columns=['Gerência', 'Qtd_Radios_Budget', 'Valor_Radios_Budget'])
+    return budget.reset_index().rename(columns={'Gerencia Padronizada': 'Gerência'})
+
+
+@instrumentado
+def agregar_em_streaming(file_path, config, progress_callback, tamanho_bloco=None):
+    """
+    Equivalente em streaming de carregar a planilha + agregar_dados_rateio: devolve os
+    DataFrames que consolidar_e_calcular_rateio espera, lendo cada aba uma única vez
+    em blocos. Diferenças possíveis em relação ao modo em memória: rádios com dois
+    eventos na mesma Data ficam com o último da planilha, e somas de valores podem
+    diferir na última casa binária (a ordem das parcelas muda).
+    """
+    if tamanho_bloco is None:
+        tamanho_bloco = tamanho_bloco_configurado(config)
+    especificacao = especificacao_rateio(config)
+    mes = pd.Timestamp.now().month
+
+    wb = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        cabecalhos = validar_estrutura(wb, especificacao)
+        progress_callback.emit("Planilha validada com sucesso.")
+
+        def blocos(chave):
+            return ler_aba_em_blocos(wb[especificacao[chave]['aba']], cabecalhos[chave], especificacao[chave], tamanho_bloco)
+
+        progress_callback.emit(f"1/3 - Agregando rádios em blocos de {tamanho_bloco} linhas...")
+        dfs = _agregar_radios(blocos('radios'), mes, progress_callback)
+        progress_callback.emit("2/3 - Agregando componentes (baterias e ressarcimentos)...")
+        dfs.update(_agregar_componentes(blocos('componentes'), mes, progress_callback))
+        progress_callback.emit("3/3 - Agregando budget...")
+        dfs['budget'] = _agregar_budget(blocos('budget'), progress_callback)
+        return dfs
+    finally:
+        wb.close()
@@ -1,97 +1,183 @@
 # Arquivo: core/atualizacao_massiva.py
 import os
+import numpy as np
 import pandas as pd
 import unicodedata
-from datetime import datetime
+from functools import lru_cache
+from core.leitura_planilha import PlanilhaInvalidaError, carregar_config, validar_planilha
+from core.cache_planilha import carregar_planilha_com_cache
+from core.exportacao import ajustar_extensao, caminho_saida_padrao, exportar, formato_configurado
+from core.instrumentacao import execucao_instrumentada, instrumentado
+
+def especificacao_atualizacao(config):
+    """Abas e colunas lidas pela atualização (nomes vêm do config.ini)."""
+    colunas_base = config['Colunas_Base_Dados']
+    # A chave de junção é categórica com um só dicionário para as três abas
+    return {
+        'base': {
+            'aba': config['Abas']['base_dados'],
+            'obrigatorias': [colunas_base['gerencia'], colunas_base['centro_custo'], colunas_base['area'], colunas_base['gestor']],
+            'tipos': {colunas_base['gerencia']: 'categoria:gerencia'},
+        },
+        # As abas de controle são regravadas por inteiro, então todas as colunas são lidas
+        'radios': {'aba': config['Abas']['controle_radios'], 'todas': True, 'tipos': {'Gerência': 'categoria:gerencia'}},
+        'componentes': {'aba': config['Abas']['controle_componentes'], 'todas': True, 'tipos': {'Gerência': 'categoria:gerencia'}},
+    }
 
 def validar_planilha_atualizacao(file_path):
     """Verifica se a planilha contém as abas e colunas necessárias para a atualização."""
-    try:
-        xls = pd.ExcelFile(file_path)
-        abas_necessarias = ['Base de Dados', 'Controle de Radios', 'Controle de Componentes']
-        for aba in abas_necessarias:
-            if aba not in xls.sheet_names:
-                return False, f"Aba necessária '{aba}' não encontrada na planilha."
-        
-        # Verificando a aba principal de referência
-        df_base_cols = pd.read_excel(file_path, sheet_name='Base de Dados', nrows=0).columns
-        colunas_base = ['Gerencia', 'CC Cobrança Rateio', 'GESTOR']
-        for col in colunas_base:
-            if col not in df_base_cols:
-                return False, f"Aba 'Base de Dados' não contém a coluna essencial: '{col}'."
-        
-        return True, ""
-    except Exception as e:
-        return False, f"Erro ao validar a planilha: {e}"
+    return validar_planilha(file_path, especificacao_atualizacao(carregar_config()))
+
+# Colunas do índice de referência montado a partir da 'Base de Dados'
+COLUNAS_REFERENCIA = ['centro de custo atualizado', 'area atualizada', 'gerente atualizado']
 
+@lru_cache(maxsize=65536)
 def normalize_text(text):
-    """Função para remover acentos e converter para minúsculas."""
+    """Função para remover acentos e converter para minúsculas (memoizada: as gerências se repetem muito)."""
     if not isinstance(text, str):
         return text
     text = ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn')
     return text.lower().strip()
 
-def run_update_process(input_path, progress_callback):
+def normalizar_chaves(serie):
+    """
+    Normaliza a coluna de gerência de forma vetorizada. Em colunas categóricas só os
+    valores distintos (categorias) passam por normalize_text.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = np.array([normalize_text(c) for c in serie.cat.categories] + [np.nan], dtype=object)
+        # Código -1 (vazio) aponta para o NaN adicionado no fim
+        return pd.Series(categorias[serie.cat.codes.to_numpy()], index=serie.index)
+    return serie.map(normalize_text)
+
+@instrumentado
+def construir_indice_referencia(df_base, col_gerencia, col_centro_custo, col_area, col_gestor):
+    """
+    Monta o índice gerência normalizada -> (centro de custo, área, gestor) da 'Base de Dados'.
+    Gerências repetidas ficam com a primeira ocorrência (como um PROCV). As que aparecem
+    com valores diferentes entram no relatório de conflitos devolvido junto com o índice.
+    """
+    df_ref = pd.DataFrame({
+        'chave': normalizar_chaves(df_base[col_gerencia]),
+        COLUNAS_REFERENCIA[0]: df_base[col_centro_custo],
+        COLUNAS_REFERENCIA[1]: df_base[col_area],
+        COLUNAS_REFERENCIA[2]: df_base[col_gestor],
+    }).dropna(subset=['chave'])
+
+    repetidas = df_ref[df_ref['chave'].duplicated(keep=False)]
+    distintos = repetidas.astype(str).drop_duplicates().groupby('chave').size()
+    linhas = repetidas.groupby('chave').size()
+    conflitos = pd.DataFrame({
+        'gerencia': distintos.index,
+        'linhas': linhas.reindex(distintos.index).to_numpy(),
+        'valores distintos': distintos.to_numpy(),
+    })
+    conflitos = conflitos[conflitos['valores distintos'] > 1].reset_index(drop=True)
+
+    indice = df_ref.drop_duplicates(subset='chave', keep='first').set_index('chave')
+    return indice, conflitos
+
+@instrumentado
+def aplicar_indice(df_controle, indice, col_gerencia):
+    """
+    Atualiza uma aba de controle a partir do índice: uma busca por hash para todas as
+    linhas (get_indexer) seguida de take. O número de linhas nunca muda.
+    """
+    posicoes = indice.index.get_indexer(normalizar_chaves(df_controle[col_gerencia]))
+    encontrados = {
+        col: pd.Series(indice[col].array.take(posicoes, allow_fill=True), index=df_controle.index)
+        for col in ('centro de custo atualizado', 'gerente atualizado')
+    }
+    df_final = df_controle.copy(deep=False)
+    df_final['status da atualizacao'] = np.where(
+        encontrados['centro de custo atualizado'].notna(), 'Atualizado com sucesso', 'Gerencia nao encontrada'
+    )
+    df_final['centro de custo'] = encontrados['centro de custo atualizado']
+    df_final['gerente'] = encontrados['gerente atualizado']
+    return df_final
+
+def relatar_conflitos(conflitos, progress_callback, limite=20):
+    """Lista no log as gerências repetidas na 'Base de Dados' com valores diferentes."""
+    if conflitos.empty:
+        return
+    progress_callback.emit(f"AVISO: {len(conflitos)} gerência(s) repetida(s) na 'Base de Dados' com dados diferentes; foi usada a primeira ocorrência.")
+    for _, linha in conflitos.head(limite).iterrows():
+        progress_callback.emit(f"   - '{linha['gerencia']}': {linha['linhas']} linhas, {linha['valores distintos']} versões diferentes")
+    if len(conflitos) > limite:
+        progress_callback.emit(f"   ... e mais {len(conflitos) - limite}.")
+
+@instrumentado
+def atualizar_controles(dados, config, progress_callback):
+    """
+    Aplica a 'Base de Dados' às abas de controle em memória.
+    Retorna {nome da aba: DataFrame atualizado}, com os cabeçalhos padronizados.
+    """
+    abas = config['Abas']
+    progress_callback.emit("Padronizando nomes de colunas...")
+    # rename devolve novos DataFrames, sem alterar os dados compartilhados em `dados`
+    df_base = dados['base'].rename(columns=normalize_text)
+    df_radios = dados['radios'].rename(columns=normalize_text)
+    df_componentes = dados['componentes'].rename(columns=normalize_text)
+    progress_callback.emit("Leitura e padronização concluídas.")
+    colunas_base = config['Colunas_Base_Dados']
+    col_gerencia = normalize_text(colunas_base['gerencia'])
+    col_centro_custo_origem = normalize_text(colunas_base['centro_custo'])
+    col_area = normalize_text(colunas_base['area'])
+    col_gestor = normalize_text(colunas_base['gestor'])
+    if col_centro_custo_origem not in df_base.columns:
+        raise KeyError(f"A coluna '{col_centro_custo_origem}' não foi encontrada na aba 'Base de Dados'. Colunas disponíveis: {list(df_base.columns)}")
+    indice, conflitos = construir_indice_referencia(df_base, col_gerencia, col_centro_custo_origem, col_area, col_gestor)
+    progress_callback.emit(f"Índice de referência montado: {len(indice)} gerências.")
+    relatar_conflitos(conflitos, progress_callback)
+
+    atualizadas = {}
+    sheets_to_update = { abas['controle_radios']: df_radios, abas['controle_componentes']: df_componentes }
+    for i, (sheet_name, df_original) in enumerate(sheets_to_update.items(), 2):
+        progress_callback.emit(f"{i}/4 - Processando aba '{sheet_name}'...")
+        atualizadas[sheet_name] = aplicar_indice(df_original, indice, col_gerencia)
+    return atualizadas
+
+def salvar_controles(atualizadas, output_path, formato='xlsx'):
+    """Grava as abas de controle atualizadas ({nome da aba: DataFrame}). Retorna os arquivos gerados."""
+    return exportar(atualizadas, output_path, formato)
+
+@execucao_instrumentada('Atualização Massiva', 'Atualizacao')
+def run_update_process(input_path, progress_callback, dados=None, usar_cache=True, arquivo_saida=None):
     """
     Executa a atualização massiva, agora salvando em uma pasta dedicada.
+    `dados` permite reaproveitar DataFrames já carregados por carregar_planilha;
+    `usar_cache=False` força a leitura da planilha mesmo que ela esteja no cache;
+    `arquivo_saida` substitui o nome padrão com data e hora (usado no processamento em lote).
+    Retorna a lista dos arquivos gerados (um por aba em csv/parquet) ou False em caso de erro.
     """
     try:
-        # ETAPA DE VALIDAÇÃO
-        progress_callback.emit("--- Validando estrutura da planilha... ---")
-        is_valid, error_message = validar_planilha_atualizacao(input_path)
-        if not is_valid:
-            progress_callback.emit(f"ERRO DE VALIDAÇÃO: {error_message}")
-            return False
-        progress_callback.emit("Planilha validada com sucesso.")
+        config = carregar_config()
+        formato = formato_configurado(config)
+        if dados is None:
+            # ETAPA DE VALIDAÇÃO + LEITURA (uma única abertura da planilha)
+            progress_callback.emit("--- Validando estrutura da planilha... ---")
+            progress_callback.emit("1/4 - Lendo planilhas...")
+            try:
+                dados = carregar_planilha_com_cache(input_path, especificacao_atualizacao(config), config, progress_callback, usar_cache)
+            except PlanilhaInvalidaError as e:
+                progress_callback.emit(f"ERRO DE VALIDAÇÃO: {e}")
+                return False
 
         progress_callback.emit("\n--- Iniciando Atualização Massiva ---")
-        
-        # ... (O restante da lógica de leitura e processamento continua igual) ...
-        progress_callback.emit("1/4 - Lendo planilhas...")
-        df_base = pd.read_excel(input_path, sheet_name='Base de Dados', engine='openpyxl')
-        df_radios = pd.read_excel(input_path, sheet_name='Controle de Radios', engine='openpyxl')
-        df_componentes = pd.read_excel(input_path, sheet_name='Controle de Componentes', engine='openpyxl')
-        progress_callback.emit("Padronizando nomes de colunas...")
-        for df in [df_base, df_radios, df_componentes]:
-            df.columns = [normalize_text(col) for col in df.columns]
-        progress_callback.emit("Leitura e padronização concluídas.")
-        col_gerencia = 'gerencia'
-        col_centro_custo_origem = 'cc cobranca rateio'
-        col_area = 'area'
-        col_gestor = 'gestor'
-        if col_centro_custo_origem not in df_base.columns:
-            raise KeyError(f"A coluna '{col_centro_custo_origem}' não foi encontrada na aba 'Base de Dados'. Colunas disponíveis: {list(df_base.columns)}")
-        df_base_ref = df_base[[col_gerencia, col_centro_custo_origem, col_area, col_gestor]].copy()
-        df_base_ref.rename(columns={
-            col_centro_custo_origem: 'centro de custo atualizado',
-            col_area: 'area atualizada',
-            col_gestor: 'gerente atualizado'
-        }, inplace=True)
-
-        # --- MELHORIA: Salvar em pasta dedicada ---
-        output_dir = "Controles_Atualizados"
-        os.makedirs(output_dir, exist_ok=True) # Cria a pasta se não existir
-
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        file_name = f'Controle_Atualizado_{timestamp}.xlsx'
-        output_path = os.path.join(output_dir, file_name)
-
-        with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-            sheets_to_update = { "Controle de Radios": df_radios, "Controle de Componentes": df_componentes }
-            for i, (sheet_name, df_original) in enumerate(sheets_to_update.items(), 2):
-                progress_callback.emit(f"{i}/4 - Processando aba '{sheet_name}'...")
-                df_merged = pd.merge(df_original, df_base_ref, on=col_gerencia, how='left')
-                df_merged['status da atualizacao'] = df_merged['centro de custo atualizado'].apply(
-                    lambda x: 'Atualizado com sucesso' if pd.notna(x) else 'Gerencia nao encontrada'
-                )
-                df_merged['centro de custo'] = df_merged['centro de custo atualizado']
-                df_merged['gerente'] = df_merged['gerente atualizado']
-                df_final = df_merged.drop(columns=['centro de custo atualizado', 'area atualizada', 'gerente atualizado'])
-                df_final.to_excel(writer, sheet_name=sheet_name, index=False)
+        atualizadas = atualizar_controles(dados, config, progress_callback)
+
+        # --- MELHORIA: Salvar em pasta dedicada (nome e formato vêm do config.ini) ---
+        if arquivo_saida is not None:
+            output_path = ajustar_extensao(arquivo_saida, formato)
+        else:
+            output_path = caminho_saida_padrao(config, 'atualizacao', formato)
+        output_dir = os.path.dirname(output_path) or "."
+
+        arquivos = salvar_controles(atualizadas, output_path, formato)
         
         progress_callback.emit("4/4 - Processo finalizado.")
         progress_callback.emit(f"SUCESSO: Arquivo gerado na pasta '{output_dir}'.")
-        return True
+        return arquivos
 
     except KeyError as e:
         progress_callback.emit(f"\nERRO DE CHAVE: A coluna {e} não foi encontrada.")
@@ -0,0 +1,200 @@
+# Arquivo: core/cache_planilha.py
+# Cache em disco das abas já lidas, em formato colunar (Arrow IPC), com descarte LRU por tamanho
+import os
+import json
+import hashlib
+import pandas as pd
+from core.leitura_planilha import aplicar_tipos, carregar_planilha, ler_booleano
+from core.instrumentacao import instrumentado
+
+# Mudar este número invalida todas as entradas antigas (ex.: mudança na conversão de células)
+VERSAO_CACHE = 2
+
+
+def configuracao_cache(config):
+    """Lê a seção [Cache] do config.ini, com valores padrão caso ela não exista."""
+    secao = config['Cache'] if config.has_section('Cache') else {}
+    return {
+        'ativo': ler_booleano(secao, 'ativo', True),
+        'diretorio': secao.get('diretorio', '.cache_planilhas'),
+        'tamanho_maximo_bytes': int(float(secao.get('tamanho_maximo_mb', '500')) * 1024 * 1024),
+    }
+
+
+def hash_arquivo(file_path, tamanho_bloco=1024 * 1024):
+    """SHA-256 do conteúdo do arquivo, lido em blocos para não carregar tudo na memória."""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _hash_especificacao(espec):
+    """Hash estável da especificação de uma aba (nome da aba + colunas pedidas)."""
+    texto = json.dumps({'versao': VERSAO_CACHE, 'espec': espec}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def _pyarrow_disponivel():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _salvar(df, caminho_base):
+    """
+    Grava a aba em Arrow IPC sem compressão (permite memory-map na leitura).
+    Colunas com tipos mistos não são aceitas pelo Arrow; nesse caso usa pickle.
+    """
+    if _pyarrow_disponivel():
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        try:
+            tabela = pa.Table.from_pandas(df, preserve_index=False)
+            caminho = caminho_base + '.arrow'
+            temporario = f"{caminho}.{os.getpid()}.tmp"
+            feather.write_feather(tabela, temporario, compression='uncompressed')
+            os.replace(temporario, caminho)
+            return caminho
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+    caminho = caminho_base + '.pkl'
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    df.to_pickle(temporario)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def _carregar(caminho_base):
+    """Carrega uma entrada do cache, se existir. Retorna None em caso de falta."""
+    caminho = caminho_base + '.arrow'
+    try:
+        if os.path.exists(caminho) and _pyarrow_disponivel():
+            import pyarrow.feather as feather
+            df = feather.read_table(caminho, memory_map=True).to_pandas()
+        elif os.path.exists(caminho_base + '.pkl'):
+            caminho = caminho_base + '.pkl'
+            df = pd.read_pickle(caminho)
+        else:
+            return None
+        # Marca o acesso para a política LRU
+        os.utime(caminho, None)
+    except OSError:
+        # Entrada removida por outro processo (descarte LRU) entre a verificação e a leitura
+        return None
+    return df
+
+
+def _descartar_excedente(diretorio, tamanho_maximo_bytes):
+    """Remove as entradas acessadas há mais tempo até o cache caber no limite."""
+    entradas = []
+    for nome in os.listdir(diretorio):
+        if nome.endswith('.tmp'):
+            continue
+        caminho = os.path.join(diretorio, nome)
+        try:
+            info = os.stat(caminho)
+        except OSError:
+            continue
+        entradas.append((info.st_mtime, info.st_size, caminho))
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, caminho in sorted(entradas):
+        if total <= tamanho_maximo_bytes:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
+
+
+def caminhos_entradas(file_path, especificacao, diretorio):
+    """Caminho base da entrada de cada aba: hash do conteúdo do arquivo + hash da especificação da aba."""
+    hash_conteudo = hash_arquivo(file_path)
+    return {
+        chave: os.path.join(diretorio, f"{hash_conteudo[:24]}_{_hash_especificacao(espec)[:16]}")
+        for chave, espec in especificacao.items()
+    }
+
+
+def entrada_em_cache(caminho_base):
+    """Se já existe uma entrada do cache em `caminho_base` (sem carregá-la)."""
+    return caminho_base is not None and (os.path.exists(caminho_base + '.arrow') or os.path.exists(caminho_base + '.pkl'))
+
+
+def carregar_aba_com_cache(file_path, chave, espec, caminho_base=None):
+    """
+    Carrega uma única aba (com os tipos aplicados só a ela): do cache, se houver entrada
+    em `caminho_base`, ou da planilha, gravando a entrada. Usada pelo executor paralelo,
+    em que cada aba é lida por um worker próprio; os dicionários de categorias são
+    reunificados depois, com aplicar_tipos sobre todas as abas. caminho_base=None ignora o cache.
+    """
+    if caminho_base is not None:
+        df = _carregar(caminho_base)
+        if df is not None:
+            return df
+    df = carregar_planilha(file_path, {chave: espec})[chave]
+    if caminho_base is not None:
+        _salvar(df, caminho_base)
+    return df
+
+
+@instrumentado
+def carregar_planilha_com_cache(file_path, especificacao, config, progress_callback=None, usar_cache=True):
+    """
+    Mesma interface de carregar_planilha, mas consulta antes o cache colunar.
+    A chave de cada aba é o hash do conteúdo do arquivo + a especificação da aba
+    (que já reflete os nomes de abas/colunas do config.ini). Só as abas ausentes
+    do cache são lidas da planilha. Com usar_cache=False o cache é ignorado.
+    """
+    opcoes = configuracao_cache(config)
+    if not (usar_cache and opcoes['ativo']):
+        return carregar_planilha(file_path, especificacao, progress_callback)
+
+    diretorio = opcoes['diretorio']
+    os.makedirs(diretorio, exist_ok=True)
+    caminhos = caminhos_entradas(file_path, especificacao, diretorio)
+
+    dados = {}
+    for chave, caminho_base in caminhos.items():
+        df = _carregar(caminho_base)
+        if df is not None:
+            dados[chave] = df
+            if progress_callback is not None:
+                progress_callback.emit(f"Aba '{especificacao[chave]['aba']}' carregada do cache ({len(df)} linhas).")
+
+    faltantes = {chave: espec for chave, espec in especificacao.items() if chave not in dados}
+    if faltantes:
+        lidos = carregar_planilha(file_path, faltantes, progress_callback)
+        for chave, df in lidos.items():
+            _salvar(df, caminhos[chave])
+            dados[chave] = df
+        _descartar_excedente(diretorio, opcoes['tamanho_maximo_bytes'])
+    elif progress_callback is not None:
+        progress_callback.emit("Planilha idêntica a uma já processada: dados lidos do cache.")
+
+    # Mantém a ordem das chaves da especificação e reunifica os dicionários de categorias,
+    # que podem ter vindo de leituras diferentes (cache parcial)
+    return aplicar_tipos({chave: dados[chave] for chave in especificacao}, especificacao)
+
+
+def aplicar_limite_cache(config):
+    """Descarta as entradas mais antigas se o cache passou do tamanho máximo configurado."""
+    opcoes = configuracao_cache(config)
+    if os.path.isdir(opcoes['diretorio']):
+        _descartar_excedente(opcoes['diretorio'], opcoes['tamanho_maximo_bytes'])
+
+
+def limpar_cache(config):
+    """Apaga todas as entradas do cache."""
+    diretorio = configuracao_cache(config)['diretorio']
+    if not os.path.isdir(diretorio):
+        return
+    for nome in os.listdir(diretorio):
+        try:
+            os.remove(os.path.join(diretorio, nome))
+        except OSError:
+            pass
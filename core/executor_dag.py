@@ -0,0 +1,105 @@
+# Arquivo: core/executor_dag.py
+# Executor de um pequeno grafo de dependências: cada nó roda assim que as dependências
+# terminam, em um pool de threads (ou de processos, para trabalho Python puro como a
+# leitura das abas). Os resultados são guardados pelo nome do nó, então não dependem
+# da ordem em que o pool termina as tarefas.
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from core.leitura_planilha import ler_booleano
+from core.instrumentacao import Span, contar_linhas, incorporar_eventos, instrumentado
+
+
+def configuracao_paralelismo(config):
+    """Lê a seção [Paralelismo] do config.ini, com valores padrão caso ela não exista."""
+    secao = config['Paralelismo'] if config.has_section('Paralelismo') else {}
+    workers = int(secao.get('workers', '0'))
+    return {
+        'ativo': ler_booleano(secao, 'ativo', True),
+        # 0 = um por núcleo
+        'workers': workers if workers > 0 else (os.cpu_count() or 1),
+        'processos': ler_booleano(secao, 'leitura_em_processos', True),
+    }
+
+
+def no(funcao, *dependencias, processo=False, rotulo=None):
+    """
+    Descreve um nó do grafo. `funcao` recebe os resultados das dependências, na ordem
+    em que foram listadas. Com processo=True o nó roda no pool de processos (a função
+    e os argumentos precisam ser serializáveis, ex.: funções de módulo + partial).
+    """
+    return {'funcao': funcao, 'dependencias': list(dependencias), 'processo': processo, 'rotulo': rotulo}
+
+
+def _executar_no(funcao, argumentos, rotulo):
+    """
+    Roda um nó dentro de um Span no próprio worker (sem o tempo de espera na fila).
+    Devolve o resultado, os segundos e os eventos medidos, emitidos depois pela thread que chamou.
+    """
+    with Span(rotulo) as span:
+        resultado = funcao(*argumentos)
+        span.linhas_saida = contar_linhas(resultado)
+    return resultado, span.segundos, span.eventos
+
+
+def _verificar_grafo(nos, entradas):
+    """Dependências inexistentes ou ciclos travariam o executor: falha antes de começar."""
+    disponiveis = set(entradas)
+    restantes = dict(nos)
+    while restantes:
+        prontos = [nome for nome, n in restantes.items() if all(d in disponiveis for d in n['dependencias'])]
+        if not prontos:
+            raise ValueError(f"Grafo inválido: dependências ausentes ou circulares em {sorted(restantes)}.")
+        for nome in prontos:
+            disponiveis.add(nome)
+            del restantes[nome]
+
+
+@instrumentado
+def executar_grafo(nos, progress_callback=None, entradas=None, workers=None, usar_processos=True):
+    """
+    Executa os nós de `nos` ({nome: no(...)}) respeitando as dependências e devolve
+    {nome: resultado}, incluindo as `entradas` (resultados já prontos, ex.: dados carregados).
+    O tempo de cada nó é informado pelo progress_callback, sempre a partir da thread que
+    chamou esta função. Se um nó falha, os que ainda não começaram são cancelados e o
+    erro é propagado. Com usar_processos=False todos os nós rodam em threads.
+    """
+    resultados = dict(entradas or {})
+    _verificar_grafo(nos, resultados)
+    workers = workers or os.cpu_count() or 1
+    pendentes = dict(nos)
+    em_execucao = {}
+    n_processos = min(workers, sum(1 for n in nos.values() if n['processo'])) if usar_processos else 0
+
+    threads = ThreadPoolExecutor(max_workers=workers)
+    processos = ProcessPoolExecutor(max_workers=n_processos) if n_processos else None
+
+    def submeter_prontos():
+        # Ordem de inserção: a submissão é a mesma a cada execução
+        for nome in list(pendentes):
+            n = pendentes[nome]
+            if all(d in resultados for d in n['dependencias']):
+                pool = processos if (n['processo'] and processos is not None) else threads
+                argumentos = [resultados[d] for d in n['dependencias']]
+                em_execucao[pool.submit(_executar_no, n['funcao'], argumentos, n['rotulo'] or nome)] = nome
+                del pendentes[nome]
+
+    try:
+        submeter_prontos()
+        while em_execucao:
+            concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in sorted(concluidos, key=em_execucao.get):
+                nome = em_execucao.pop(futuro)
+                resultados[nome], segundos, eventos = futuro.result()
+                incorporar_eventos(eventos)
+                if progress_callback is not None:
+                    progress_callback.emit(f"   [{nos[nome]['rotulo'] or nome}] concluído em {segundos:.2f} s")
+            submeter_prontos()
+    except BaseException:
+        for futuro in em_execucao:
+            futuro.cancel()
+        raise
+    finally:
+        threads.shutdown(wait=True)
+        if processos is not None:
+            processos.shutdown(wait=True)
+    return resultados
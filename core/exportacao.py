@@ -0,0 +1,171 @@
+# Arquivo: core/exportacao.py
+# Camada de exportação dos resultados. O .xlsx é gravado linha a linha pelo xlsxwriter em
+# modo constant_memory (só a linha atual fica na memória do writer); CSV e Parquet gravam
+# um arquivo por aba, em paralelo. O formato vem de [Nomes_Arquivos_Saida] no config.ini.
+import os
+import math
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from core.instrumentacao import instrumentado
+
+FORMATOS = {'xlsx': '.xlsx', 'csv': '.csv', 'parquet': '.parquet'}
+NOMES_PADRAO = {'rateio': 'Relatorios_Rateio/Rateio_Final', 'atualizacao': 'Controles_Atualizados/Controle_Atualizado'}
+# Mesmos formatos de data que o DataFrame.to_excel aplica, para o arquivo ficar igual ao de antes
+FORMATO_DATA_HORA = 'YYYY-MM-DD HH:MM:SS'
+FORMATO_DATA = 'YYYY-MM-DD'
+CARACTERES_INVALIDOS = '\\/:*?"<>|'
+
+
+def formato_configurado(config):
+    """Formato de saída ('xlsx', 'csv' ou 'parquet'), da chave `formato` de [Nomes_Arquivos_Saida]."""
+    formato = 'xlsx'
+    if config.has_section('Nomes_Arquivos_Saida'):
+        formato = config['Nomes_Arquivos_Saida'].get('formato', 'xlsx').strip().lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de saída '{formato}' inválido em [Nomes_Arquivos_Saida]. Use: {', '.join(FORMATOS)}.")
+    return formato
+
+
+def caminho_saida_padrao(config, processo, formato=None, timestamp=None, rotulo=None):
+    """
+    Caminho do resultado a partir do nome configurado (ex.: Relatorios_Rateio/Rateio_Final_<data e hora>.xlsx).
+    `rotulo` entra antes da data e hora (ex.: o período de um rateio histórico).
+    """
+    base = NOMES_PADRAO[processo]
+    if config.has_section('Nomes_Arquivos_Saida'):
+        base = config['Nomes_Arquivos_Saida'].get(processo, base)
+    timestamp = timestamp or datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    if rotulo:
+        base = f"{base}_{rotulo}"
+    return f"{base}_{timestamp}{FORMATOS[formato or formato_configurado(config)]}"
+
+
+def ajustar_extensao(caminho, formato):
+    """Troca a extensão de um caminho informado pelo usuário pela do formato configurado."""
+    raiz, extensao = os.path.splitext(caminho)
+    if extensao.lower() in FORMATOS.values():
+        caminho = raiz
+    return caminho + FORMATOS[formato]
+
+
+def _valor_objeto(valor):
+    """Mesma conversão do ExcelWriter do pandas para valores de colunas object. Retorna (valor, formato)."""
+    if valor is None or isinstance(valor, (str, bool, int, float, datetime)):
+        return valor, None
+    if isinstance(valor, date):
+        return valor, FORMATO_DATA
+    if isinstance(valor, timedelta):
+        return valor.total_seconds() / 86400, '0'
+    return str(valor), None
+
+
+def _valores_da_coluna(serie):
+    """
+    Converte uma coluna em valores Python para o xlsxwriter: vazios viram None e infinitos,
+    texto (como no to_excel). Retorna (valores, formatos), com formatos=None se a coluna
+    não tiver células com formato próprio (datas sem hora, intervalos de tempo).
+    """
+    valores = serie.tolist()
+    vazios = serie.isna().to_numpy()
+    if vazios.any():
+        for i in vazios.nonzero()[0]:
+            valores[i] = None
+    formatos = None
+    if pd.api.types.is_float_dtype(serie.dtype):
+        for i, valor in enumerate(valores):
+            if valor is not None and math.isinf(valor):
+                valores[i] = 'inf' if valor > 0 else '-inf'
+    elif serie.dtype == object:
+        convertidos = [_valor_objeto(valor) for valor in valores]
+        valores = [valor for valor, _ in convertidos]
+        if any(formato is not None for _, formato in convertidos):
+            formatos = [formato for _, formato in convertidos]
+    return valores, formatos
+
+
+def _gravar_xlsx(abas, caminho):
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True, 'default_date_format': FORMATO_DATA_HORA})
+    try:
+        formatos_celula = {}
+        for nome_aba, df in abas.items():
+            worksheet = workbook.add_worksheet(nome_aba)
+            worksheet.write_row(0, 0, list(df.columns))
+            # Conversão por coluna (vetorizada); a escrita é por linha, na ordem exigida pelo constant_memory
+            convertidas = [_valores_da_coluna(df.iloc[:, i]) for i in range(df.shape[1])]
+            colunas = [valores for valores, _ in convertidas]
+            especiais = [(i, formatos) for i, (_, formatos) in enumerate(convertidas) if formatos is not None]
+            for linha, valores in enumerate(zip(*colunas), 1):
+                worksheet.write_row(linha, 0, valores)
+                for coluna, formatos in especiais:
+                    # Reescreve, na mesma linha, as células que precisam de formato próprio
+                    formato = formatos[linha - 1]
+                    if formato is not None:
+                        if formato not in formatos_celula:
+                            formatos_celula[formato] = workbook.add_format({'num_format': formato})
+                        worksheet.write(linha, coluna, valores[coluna], formatos_celula[formato])
+    finally:
+        workbook.close()
+
+
+def _preparar_parquet(df):
+    """O Arrow não aceita colunas com tipos misturados (ex.: números e textos): elas viram texto."""
+    import pyarrow as pa
+    df = df.copy(deep=False)
+    df.columns = [str(c) for c in df.columns]
+    for coluna in df.columns:
+        if df[coluna].dtype == object:
+            try:
+                pa.array(df[coluna], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                df[coluna] = df[coluna].map(lambda v: v if v is None or (isinstance(v, float) and math.isnan(v)) else str(v))
+    return df
+
+
+def _gravar_tabela(df, caminho, formato):
+    if formato == 'csv':
+        # Mesmo padrão do resumo da linha de comando: ';' e BOM, para abrir direto no Excel
+        df.to_csv(caminho, index=False, sep=';', encoding='utf-8-sig')
+    else:
+        _preparar_parquet(df).to_parquet(caminho, index=False)
+
+
+def _gravar_parte(gravar, caminho, *args):
+    """Grava em um arquivo temporário e só então o coloca no lugar: não sobra resultado pela metade."""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        gravar(*args, temporario)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return caminho
+
+
+@instrumentado
+def exportar(abas, caminho, formato='xlsx'):
+    """
+    Grava {nome da aba: DataFrame} em `caminho` e devolve a lista de arquivos gerados.
+    No xlsx todas as abas vão para o mesmo arquivo. Em CSV/Parquet cada aba é um arquivo
+    (com o nome da aba como sufixo quando há mais de uma), gravados em paralelo.
+    """
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    if formato == 'xlsx':
+        return [_gravar_parte(_gravar_xlsx, caminho, abas)]
+
+    raiz, extensao = os.path.splitext(caminho)
+    destinos = {}
+    for nome_aba in abas:
+        if len(abas) == 1:
+            destinos[nome_aba] = caminho
+        else:
+            sufixo = ''.join('_' if c in CARACTERES_INVALIDOS else c for c in nome_aba)
+            destinos[nome_aba] = f"{raiz}_{sufixo}{extensao}"
+    with ThreadPoolExecutor(max_workers=len(abas)) as pool:
+        futuros = [
+            pool.submit(_gravar_parte, lambda df, temporario: _gravar_tabela(df, temporario, formato), destinos[nome_aba], df)
+            for nome_aba, df in abas.items()
+        ]
+        return [futuro.result() for futuro in futuros]
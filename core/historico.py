@@ -0,0 +1,457 @@
+# Arquivo: core/historico.py
+# Histórico mensal do rateio em SQLite. Cada versão da planilha é ingerida uma única vez
+# (identificada pelo hash do arquivo) e guardada como totais por mês e por (Gerência,
+# Centro de custo, Atividade). O rateio de qualquer mês ou intervalo, com qualquer data de
+# corte, sai de consultas indexadas, sem reler o Excel nem reprocessar as linhas.
+import os
+import json
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from core.leitura_planilha import PlanilhaInvalidaError, carregar_config
+from core.cache_planilha import carregar_planilha_com_cache, hash_arquivo
+from core.processamento_rateio import (
+    CHAVES_GRUPO, agregar_dados_rateio, comparar_rateios, consolidar_e_calcular_rateio, especificacao_rateio,
+    montar_sumario_radios, periodo_rateio, processar_baterias, renomear_generic,
+)
+from core.exportacao import ajustar_extensao, caminho_saida_padrao, exportar, formato_configurado
+from core.instrumentacao import execucao_instrumentada, instrumentado
+
+VERSAO_HISTORICO = 1
+# Mês final dos estados que continuam valendo (nenhum evento posterior do mesmo rádio)
+MES_ABERTO = 999999
+# Tolerância relativa da verificação contra o rateio em memória
+TOLERANCIA_VERIFICACAO = 1e-9
+
+# Chaves categóricas com códigos numéricos chegam como inteiros do numpy
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.int32, int)
+
+# Estados (estado_radios, estado_corte) valem do mês de início (inclusive) ao mês de fim
+# (exclusive): somar as linhas com mes_inicio <= M < mes_fim dá o último estado no fim de M.
+# Movimentos são totais aditivos por mês.
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS bases (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL UNIQUE,
+    arquivo TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    assinatura TEXT NOT NULL,
+    ingerida_em TEXT NOT NULL,
+    radios_com_quantidade INTEGER NOT NULL,
+    primeiro_mes INTEGER,
+    ultimo_mes INTEGER,
+    linhas_sem_data INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS estado_radios (
+    base_id INTEGER NOT NULL REFERENCES bases(id),
+    mes_inicio INTEGER NOT NULL,
+    mes_fim INTEGER NOT NULL,
+    gerencia, centro_custo, atividade,
+    radios INTEGER NOT NULL,
+    valor REAL
+);
+CREATE INDEX IF NOT EXISTS idx_estado_radios ON estado_radios (base_id, mes_inicio, mes_fim);
+CREATE TABLE IF NOT EXISTS estado_corte (
+    base_id INTEGER NOT NULL REFERENCES bases(id),
+    mes_inicio INTEGER NOT NULL,
+    mes_fim INTEGER NOT NULL,
+    gerencia,
+    dia TEXT NOT NULL,
+    linhas INTEGER NOT NULL,
+    radios INTEGER NOT NULL,
+    valor REAL
+);
+CREATE INDEX IF NOT EXISTS idx_estado_corte ON estado_corte (base_id, mes_inicio, mes_fim, dia);
+CREATE TABLE IF NOT EXISTS movimentos (
+    base_id INTEGER NOT NULL REFERENCES bases(id),
+    aba TEXT NOT NULL,
+    mes INTEGER NOT NULL,
+    gerencia, centro_custo, atividade,
+    bateria INTEGER,
+    linhas INTEGER NOT NULL,
+    ids INTEGER,
+    quantidade REAL,
+    valor REAL
+);
+CREATE INDEX IF NOT EXISTS idx_movimentos ON movimentos (base_id, aba, atividade, mes);
+CREATE TABLE IF NOT EXISTS budget (
+    base_id INTEGER NOT NULL REFERENCES bases(id),
+    gerencia,
+    solicitacoes INTEGER NOT NULL,
+    valor REAL
+);
+"""
+TABELAS_AGREGADOS = ['estado_radios', 'estado_corte', 'movimentos', 'budget']
+
+
+def configuracao_historico(config):
+    """Lê a seção [Historico] do config.ini, com valores padrão caso ela não exista."""
+    secao = config['Historico'] if config.has_section('Historico') else {}
+    return {'arquivo': secao.get('arquivo', '.historico/historico_rateio.sqlite')}
+
+
+def abrir_historico(caminho):
+    """Abre (ou cria) o banco do histórico, com as tabelas e índices."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    # Processos do lote podem ingerir planilhas ao mesmo tempo: a escrita espera o lock.
+    # Sem transações implícitas: cada uma é aberta por _transacao
+    conexao = sqlite3.connect(caminho, timeout=600, isolation_level=None)
+    conexao.executescript(ESQUEMA)
+    return conexao
+
+
+@contextmanager
+def _transacao(conexao):
+    """
+    Transação com o lock de escrita desde o início (BEGIN IMMEDIATE). Dentro de uma
+    transação já aberta, só participa dela (o commit fica com a mais externa).
+    """
+    if conexao.in_transaction:
+        yield
+        return
+    conexao.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conexao.rollback()
+        raise
+    conexao.commit()
+
+
+def _nome_base(file_path, nome_base=None):
+    """Identificação da base no histórico: por padrão, o caminho absoluto da planilha."""
+    return nome_base or os.path.abspath(file_path)
+
+
+def _base_atual(conexao, nome_base, hash_atual, assinatura):
+    """Id da base se esta versão da planilha (hash e assinatura) já está no histórico, senão None."""
+    existente = conexao.execute("SELECT id, hash, assinatura FROM bases WHERE nome = ?", (nome_base,)).fetchone()
+    if existente and existente[1] == hash_atual and existente[2] == assinatura:
+        return existente[0]
+    return None
+
+
+def _assinatura(config):
+    """Muda quando algo que afeta os agregados muda: versão do formato ou colunas lidas."""
+    texto = json.dumps({'versao': VERSAO_HISTORICO, 'espec': especificacao_rateio(config)}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def _meses(datas):
+    """Mês de cada data como inteiro AAAAMM."""
+    return (datas.dt.year * 100 + datas.dt.month).to_numpy(dtype='int64')
+
+
+def _fim_dos_estados(ids, meses):
+    """
+    Para linhas em ordem cronológica, o mês (exclusive) em que cada linha deixa de ser o
+    último estado do seu rádio: o mês da próxima linha do mesmo rádio. Os rádios sem ID
+    formam um único rádio, como no drop_duplicates do rateio.
+    """
+    codigos = pd.factorize(ids)[0]
+    proximo = pd.Series(meses).groupby(codigos).shift(-1)
+    return proximo.fillna(MES_ABERTO).to_numpy(dtype='int64')
+
+
+def _objeto(serie, mascara=None):
+    valores = serie.astype(object).to_numpy()
+    return valores if mascara is None else valores[mascara]
+
+
+def _agregados_radios(radios):
+    """Estados do sumário e do corte (por intervalo de meses) e movimentos mensais da aba de rádios."""
+    datas = pd.to_datetime(radios['Data'])
+    com_data = datas.notna().to_numpy()
+    # Mesma ordem do rateio em memória: ordenação estável por Data, na ordem da planilha
+    ordem = np.flatnonzero(com_data)[np.argsort(datas.to_numpy()[com_data], kind='stable')]
+    df = radios.take(ordem)
+    datas = datas.take(ordem)
+    meses = _meses(datas)
+    valores = df['Valor'].to_numpy()
+
+    # Sumário: último estado considerando só linhas com ID, Gerência e Centro de custo
+    validas = df[['ID do rádio', 'Gerência', 'Centro de custo']].notna().all(axis=1).to_numpy()
+    fim_validas = _fim_dos_estados(df['ID do rádio'][validas], meses[validas])
+    manter = (meses[validas] < fim_validas) & df['Atividade'][validas].isin(['Entrega', 'Devolução']).to_numpy()
+    mascara = np.flatnonzero(validas)[manter]
+    estado_radios = pd.DataFrame({
+        'mes_inicio': meses[mascara], 'mes_fim': fim_validas[manter],
+        'gerencia': _objeto(df['Gerência'], mascara), 'centro_custo': _objeto(df['Centro de custo'], mascara),
+        'atividade': _objeto(df['Atividade'], mascara), 'valor': valores[mascara],
+    }).groupby(['mes_inicio', 'mes_fim', 'gerencia', 'centro_custo', 'atividade'], sort=False).agg(
+        radios=('valor', 'size'), valor=('valor', 'sum')
+    ).reset_index()
+
+    # Corte: último estado considerando todas as linhas; guarda o dia do evento para
+    # que qualquer data de corte possa ser aplicada na consulta
+    fim_todos = _fim_dos_estados(df['ID do rádio'], meses)
+    mascara = (meses < fim_todos) & (df['Atividade'] == 'Entrega').to_numpy() & df['Gerência'].notna().to_numpy()
+    estado_corte = pd.DataFrame({
+        'mes_inicio': meses[mascara], 'mes_fim': fim_todos[mascara],
+        'gerencia': _objeto(df['Gerência'], mascara), 'dia': datas.dt.normalize().to_numpy()[mascara],
+        'com_id': df['ID do rádio'].notna().to_numpy()[mascara], 'valor': valores[mascara],
+    }).groupby(['mes_inicio', 'mes_fim', 'gerencia', 'dia'], sort=False).agg(
+        linhas=('valor', 'size'), radios=('com_id', 'sum'), valor=('valor', 'sum')
+    ).reset_index()
+    estado_corte['dia'] = estado_corte['dia'].dt.strftime('%Y-%m-%d')
+
+    # Movimentos: totais por mês e (Gerência, Centro de custo, Atividade)
+    mascara = df[['Gerência', 'Centro de custo', 'Atividade']].notna().all(axis=1).to_numpy()
+    movimentos = pd.DataFrame({
+        'mes': meses[mascara], 'gerencia': _objeto(df['Gerência'], mascara),
+        'centro_custo': _objeto(df['Centro de custo'], mascara), 'atividade': _objeto(df['Atividade'], mascara),
+        'com_id': df['ID do rádio'].notna().to_numpy()[mascara],
+        'quantidade': df['Quantidade'].to_numpy()[mascara] if 'Quantidade' in df.columns else np.nan,
+        'valor': valores[mascara],
+    }).groupby(['mes', 'gerencia', 'centro_custo', 'atividade'], sort=False).agg(
+        linhas=('valor', 'size'), ids=('com_id', 'sum'), quantidade=('quantidade', 'sum'), valor=('valor', 'sum')
+    ).reset_index()
+    movimentos.insert(0, 'aba', 'radios')
+    movimentos['bateria'] = None
+    if 'Quantidade' not in df.columns:
+        movimentos['quantidade'] = None
+    return estado_radios, estado_corte, movimentos, meses
+
+
+def _agregados_componentes(componentes):
+    """Movimentos mensais da aba de componentes, separando baterias dos demais equipamentos."""
+    datas = pd.to_datetime(componentes['Data'])
+    mascara = (datas.notna() & componentes[['Gerência', 'Centro de custo', 'Atividade']].notna().all(axis=1)).to_numpy()
+    df = componentes[mascara]
+    movimentos = pd.DataFrame({
+        'mes': _meses(datas[mascara]), 'gerencia': _objeto(df['Gerência']),
+        'centro_custo': _objeto(df['Centro de custo']), 'atividade': _objeto(df['Atividade']),
+        'bateria': (df['Equipamento'] == 'Bateria').to_numpy().astype('int64'),
+        'quantidade': df['Quantidade'].to_numpy(), 'valor': df['Valor'].to_numpy(),
+    }).groupby(['mes', 'gerencia', 'centro_custo', 'atividade', 'bateria'], sort=False).agg(
+        linhas=('valor', 'size'), quantidade=('quantidade', 'sum'), valor=('valor', 'sum')
+    ).reset_index()
+    movimentos.insert(0, 'aba', 'componentes')
+    movimentos['ids'] = None
+    return movimentos, _meses(datas[datas.notna().to_numpy()])
+
+
+@instrumentado
+def agregados_historico(dados):
+    """Tabelas do histórico (DataFrames) a partir das abas carregadas para o rateio."""
+    estado_radios, estado_corte, movimentos_radios, meses_radios = _agregados_radios(dados['radios'])
+    movimentos_componentes, meses_componentes = _agregados_componentes(dados['componentes'])
+    colunas_movimentos = ['aba', 'mes', 'gerencia', 'centro_custo', 'atividade', 'bateria', 'linhas', 'ids', 'quantidade', 'valor']
+    budget = dados['budget']
+    budget = pd.DataFrame({
+        'gerencia': _objeto(budget['Gerencia Padronizada']), 'valor': budget['Valor'].to_numpy(),
+    }).groupby('gerencia', sort=False).agg(solicitacoes=('valor', 'size'), valor=('valor', 'sum')).reset_index()
+    meses = np.concatenate([meses_radios, meses_componentes])
+    return {
+        'estado_radios': estado_radios,
+        'estado_corte': estado_corte,
+        'movimentos': pd.concat([movimentos_radios[colunas_movimentos], movimentos_componentes[colunas_movimentos]], ignore_index=True),
+        'budget': budget,
+        'primeiro_mes': int(meses.min()) if len(meses) else None,
+        'ultimo_mes': int(meses.max()) if len(meses) else None,
+        'linhas_sem_data': int(pd.to_datetime(dados['radios']['Data']).isna().sum() + pd.to_datetime(dados['componentes']['Data']).isna().sum()),
+        'radios_com_quantidade': int('Quantidade' in dados['radios'].columns),
+    }
+
+
+def _gravar_tabela(conexao, tabela, base_id, df):
+    colunas = list(df.columns)
+    sql = f"INSERT INTO {tabela} (base_id, {', '.join(colunas)}) VALUES ({', '.join('?' * (len(colunas) + 1))})"
+    # NaN vira NULL (SUM ignora NULL, como o sum do pandas ignora NaN)
+    linhas = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    conexao.executemany(sql, ((base_id,) + linha for linha in linhas))
+
+
+@instrumentado
+def ingerir_planilha(conexao, file_path, config, progress_callback, nome_base=None, usar_cache=True,
+                     dados=None, hash_atual=None):
+    """
+    Ingere a planilha no histórico, se esta versão (hash do arquivo) ainda não estiver lá.
+    Cada base (por padrão, o caminho absoluto da planilha) guarda a última versão ingerida:
+    a planilha de controle é cumulativa, então a versão mais nova já contém todos os meses
+    anteriores. `dados` evita reler abas já carregadas. A verificação e a gravação ocorrem
+    na mesma transação (ou na do chamador, se houver uma aberta).
+    Retorna (id da base, abas carregadas; se a versão já estava no histórico, `dados` como recebido).
+    """
+    nome_base = _nome_base(file_path, nome_base)
+    hash_atual = hash_atual or hash_arquivo(file_path)
+    assinatura = _assinatura(config)
+    with _transacao(conexao):
+        base_id = _base_atual(conexao, nome_base, hash_atual, assinatura)
+        if base_id is not None:
+            progress_callback.emit(f"Planilha já ingerida no histórico (base '{nome_base}'): usando os agregados salvos.")
+            return base_id, dados
+        return _gravar_base(conexao, file_path, config, progress_callback, nome_base, usar_cache, dados, hash_atual, assinatura)
+
+
+def _gravar_base(conexao, file_path, config, progress_callback, nome_base, usar_cache, dados, hash_atual, assinatura):
+    """Substitui os agregados da base pelos desta versão da planilha (dentro de uma transação)."""
+    progress_callback.emit(f"Ingerindo a planilha no histórico (base '{nome_base}')...")
+    if dados is None:
+        dados = carregar_planilha_com_cache(file_path, especificacao_rateio(config), config, progress_callback, usar_cache)
+    tabelas = agregados_historico(dados)
+    existente = conexao.execute("SELECT id FROM bases WHERE nome = ?", (nome_base,)).fetchone()
+    registro = {
+        'arquivo': os.path.abspath(file_path), 'hash': hash_atual, 'assinatura': assinatura,
+        'ingerida_em': datetime.now().isoformat(timespec='seconds'),
+        'radios_com_quantidade': tabelas['radios_com_quantidade'],
+        'primeiro_mes': tabelas['primeiro_mes'], 'ultimo_mes': tabelas['ultimo_mes'],
+        'linhas_sem_data': tabelas['linhas_sem_data'],
+    }
+    if existente:
+        base_id = existente[0]
+        for tabela in TABELAS_AGREGADOS:
+            conexao.execute(f"DELETE FROM {tabela} WHERE base_id = ?", (base_id,))
+        conexao.execute(f"UPDATE bases SET {', '.join(f'{c} = ?' for c in registro)} WHERE id = ?", (*registro.values(), base_id))
+    else:
+        base_id = conexao.execute(
+            f"INSERT INTO bases (nome, {', '.join(registro)}) VALUES ({', '.join('?' * (len(registro) + 1))})",
+            (nome_base, *registro.values()),
+        ).lastrowid
+    for tabela in TABELAS_AGREGADOS:
+        _gravar_tabela(conexao, tabela, base_id, tabelas[tabela])
+    if tabelas['linhas_sem_data']:
+        progress_callback.emit(f"AVISO: {tabelas['linhas_sem_data']} linha(s) sem data não entram no histórico.")
+    progress_callback.emit(f"Histórico atualizado: meses de {tabelas['primeiro_mes']} a {tabelas['ultimo_mes']}.")
+    return base_id, dados
+
+
+def _consulta(conexao, sql, parametros, colunas):
+    return pd.DataFrame(conexao.execute(sql, parametros).fetchall(), columns=colunas)
+
+
+@instrumentado
+def agregados_do_historico(conexao, base_id, periodo):
+    """
+    Os mesmos DataFrames de agregar_dados_rateio(dados, callback, periodo), montados a partir
+    dos totais mensais: o estado dos rádios e das baterias no fim do período, ressarcimentos e
+    instalações dentro dele e as entregas anteriores à data de corte.
+    """
+    mes_inicial, mes_final = periodo['mes_inicial'], periodo['mes_final']
+    radios_com_quantidade = conexao.execute("SELECT radios_com_quantidade FROM bases WHERE id = ?", (base_id,)).fetchone()[0]
+    dfs = {}
+
+    sumario = _consulta(conexao, """
+        SELECT gerencia, centro_custo, atividade, SUM(radios), SUM(valor) FROM estado_radios
+        WHERE base_id = ? AND mes_inicio <= ? AND mes_fim > ?
+        GROUP BY gerencia, centro_custo, atividade ORDER BY gerencia, centro_custo, atividade
+    """, (base_id, mes_final, mes_final), CHAVES_GRUPO + ['Atividade', 'Qtd', 'Valor'])
+    sumario = sumario[sumario['Qtd'] > 0]
+    dfs['sumario_radios'] = montar_sumario_radios(sumario.set_index(CHAVES_GRUPO + ['Atividade']))
+
+    dfs['corte_fevereiro'] = _consulta(conexao, """
+        SELECT gerencia, SUM(radios), SUM(valor) FROM estado_corte
+        WHERE base_id = ? AND mes_inicio <= ? AND mes_fim > ? AND dia < ?
+        GROUP BY gerencia ORDER BY gerencia
+    """, (base_id, mes_final, mes_final, periodo['corte'].strftime('%Y-%m-%d')),
+        ['Gerência', 'Qtd_Radios_Corte_Fevereiro', 'Valor_Radios_Corte_Fevereiro'])
+
+    # Ressarcimentos e instalações de rádios: mesmas colunas de agregar_radios
+    coluna_qtd = 'Quantidade' if radios_com_quantidade else 'ID do rádio'
+    for atividade, sufixo, chave in [('Ressarcimento', 'Ressarcimento_Radios', 'ressarc_radios'),
+                                     ('Instalação', 'Instalacao_Radios', 'instal_radios')]:
+        summary = _consulta(conexao, f"""
+            SELECT gerencia, centro_custo, SUM(valor), SUM({'quantidade' if radios_com_quantidade else 'ids'}) FROM movimentos
+            WHERE base_id = ? AND aba = 'radios' AND atividade = ? AND mes BETWEEN ? AND ?
+            GROUP BY gerencia, centro_custo ORDER BY gerencia, centro_custo
+        """, (base_id, atividade, mes_inicial, mes_final), CHAVES_GRUPO + ['Valor', coluna_qtd])
+        dfs[chave] = renomear_generic(summary, sufixo)
+
+    # Baterias: o pivot de processar_baterias sobre os totais acumulados até o fim do período
+    baterias = _consulta(conexao, """
+        SELECT gerencia, centro_custo, atividade, SUM(quantidade), SUM(valor) FROM movimentos
+        WHERE base_id = ? AND aba = 'componentes' AND bateria = 1 AND mes <= ?
+        GROUP BY gerencia, centro_custo, atividade ORDER BY gerencia, centro_custo, atividade
+    """, (base_id, mes_final), CHAVES_GRUPO + ['Atividade', 'Quantidade', 'Valor'])
+    baterias['Equipamento'] = 'Bateria'
+    dfs['baterias'] = processar_baterias(baterias)
+
+    dfs['budget'] = _consulta(conexao, """
+        SELECT gerencia, solicitacoes, valor FROM budget WHERE base_id = ? ORDER BY gerencia
+    """, (base_id,), ['Gerência', 'Qtd_Radios_Budget', 'Valor_Radios_Budget'])
+
+    dfs['ressarc_comp'] = renomear_generic(_consulta(conexao, """
+        SELECT gerencia, centro_custo, SUM(valor), SUM(quantidade) FROM movimentos
+        WHERE base_id = ? AND aba = 'componentes' AND atividade = 'Ressarcimento' AND mes BETWEEN ? AND ?
+        GROUP BY gerencia, centro_custo ORDER BY gerencia, centro_custo
+    """, (base_id, mes_inicial, mes_final), CHAVES_GRUPO + ['Valor', 'Quantidade']), 'Ressarcimento_Componentes')
+    return dfs
+
+
+@execucao_instrumentada('Rateio (histórico)', 'Historico')
+def run_historical_process(file_path, progress_callback, mes_inicial, mes_final=None, data_corte=None,
+                           usar_cache=True, arquivo_saida=None, verificar=False, nome_base=None):
+    """
+    Rateio de um mês ou intervalo ('2025-03', ou mes_inicial a mes_final) a partir do histórico.
+    A planilha só é lida se esta versão ainda não foi ingerida. `data_corte` substitui a data
+    do corte de fevereiro; `verificar=True` compara o resultado com o rateio em memória
+    calculado para o mesmo período. Retorna a lista dos arquivos gerados ou False em caso de erro.
+    """
+    try:
+        config = carregar_config()
+        formato = formato_configurado(config)
+        periodo = periodo_rateio(mes_inicial, mes_final, data_corte)
+        caminho_historico = configuracao_historico(config)['arquivo']
+
+        progress_callback.emit(f"--- Fase 1: Histórico mensal ('{caminho_historico}') ---")
+        conexao = abrir_historico(caminho_historico)
+        try:
+            nome_base = _nome_base(file_path, nome_base)
+            hash_atual = hash_arquivo(file_path)
+            try:
+                # A leitura da planilha (demorada) fica fora do lock de escrita do histórico
+                dados = None
+                if _base_atual(conexao, nome_base, hash_atual, _assinatura(config)) is None:
+                    dados = carregar_planilha_com_cache(file_path, especificacao_rateio(config), config, progress_callback, usar_cache)
+                # Ingestão e consulta na mesma transação: outro processo do lote não troca a
+                # base entre as duas
+                with _transacao(conexao):
+                    base_id, dados = ingerir_planilha(conexao, file_path, config, progress_callback, nome_base,
+                                                      usar_cache, dados, hash_atual)
+                    primeiro_mes, ultimo_mes = conexao.execute("SELECT primeiro_mes, ultimo_mes FROM bases WHERE id = ?", (base_id,)).fetchone()
+                    if primeiro_mes is None or periodo['mes_final'] < primeiro_mes or periodo['mes_inicial'] > ultimo_mes:
+                        progress_callback.emit(f"AVISO: o histórico desta planilha vai de {primeiro_mes} a {ultimo_mes}; o período pedido fica fora dele.")
+
+                    progress_callback.emit(f"\n--- Fase 2: Agregados do período {periodo['rotulo']} ---")
+                    dfs = agregados_do_historico(conexao, base_id, periodo)
+            except PlanilhaInvalidaError as e:
+                progress_callback.emit(f"ERRO DE VALIDAÇÃO: {e}")
+                return False
+        finally:
+            conexao.close()
+
+        progress_callback.emit("\n--- Fase 3: Consolidação e Cálculos Finais ---")
+        df_rateio_final = consolidar_e_calcular_rateio(dfs)
+
+        if verificar:
+            progress_callback.emit("Verificando o resultado do histórico contra o rateio em memória...")
+            if dados is None:
+                dados = carregar_planilha_com_cache(file_path, especificacao_rateio(config), config, progress_callback, usar_cache)
+            em_memoria = consolidar_e_calcular_rateio(agregar_dados_rateio(dados, progress_callback, periodo))
+            # Os totais do histórico são somas de subtotais mensais: os valores podem diferir do
+            # cálculo em memória no último dígito (ordem das somas em ponto flutuante)
+            iguais, detalhe = comparar_rateios(df_rateio_final, em_memoria, TOLERANCIA_VERIFICACAO)
+            if iguais:
+                progress_callback.emit("VERIFICAÇÃO OK: o rateio do histórico confere com o rateio em memória.")
+            else:
+                progress_callback.emit(f"AVISO: o rateio do histórico diverge do rateio em memória ({detalhe}). Usando o rateio em memória.")
+                df_rateio_final = em_memoria
+
+        if arquivo_saida is not None:
+            output_path = ajustar_extensao(arquivo_saida, formato)
+        else:
+            output_path = caminho_saida_padrao(config, 'rateio', formato, rotulo=periodo['rotulo'])
+        output_dir = os.path.dirname(output_path) or "."
+
+        progress_callback.emit(f"\n--- Fase 4: Exportando resultado para '{output_path}' ---")
+        arquivos = exportar({'Rateio': df_rateio_final}, output_path, formato)
+        progress_callback.emit(f"SUCESSO: Arquivo gerado na pasta '{output_dir}'.")
+        return arquivos
+
+    except Exception as e:
+        progress_callback.emit(f"\nERRO DURANTE O PROCESSAMENTO: {e}")
+        return False
@@ -0,0 +1,341 @@
+# Arquivo: core/instrumentacao.py
+# Medição estruturada das etapas. Cada Span mede tempo de relógio, tempo de CPU, linhas de
+# entrada e saída e o acréscimo de memória (RSS), e vira um evento (dicionário) enviado pelo
+# método opcional evento() do progress_callback, ao lado das mensagens de texto do log.
+# Só usa a biblioteca padrão: a interface importa este módulo sem carregar o pandas.
+import os
+import sys
+import json
+import time
+import itertools
+import functools
+import threading
+import unicodedata
+from datetime import datetime
+
+INTERVALO_AMOSTRAGEM = 0.01
+MB = 1024 * 1024
+FORMATOS_EXPORTACAO = {'json': '.json', 'chrome': '.trace.json'}
+
+_local = threading.local()
+_contador = itertools.count(1)
+
+
+def rss_atual():
+    """Memória residente (RSS) atual do processo, em bytes. None se o sistema não permitir medir."""
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (nome, ctypes.c_size_t) for nome in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage',
+                )
+            ]
+
+        contadores = PROCESS_MEMORY_COUNTERS()
+        contadores.cb = ctypes.sizeof(contadores)
+        processo = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(processo, ctypes.byref(contadores), contadores.cb):
+            return contadores.WorkingSetSize
+    return None
+
+
+class _AmostradorMemoria:
+    """
+    Uma única thread amostra o RSS enquanto houver spans abertos e atualiza o pico de cada um
+    (o pico informado pelo sistema é do processo inteiro e não pode ser zerado entre etapas).
+    """
+
+    def __init__(self):
+        self._ativos = set()
+        self._trava = threading.Lock()
+        self._thread = None
+
+    def registrar(self, span):
+        with self._trava:
+            self._ativos.add(span)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._amostrar, daemon=True, name='nexus-memoria')
+                self._thread.start()
+
+    def remover(self, span):
+        with self._trava:
+            self._ativos.discard(span)
+
+    def _amostrar(self):
+        while True:
+            time.sleep(INTERVALO_AMOSTRAGEM)
+            rss = rss_atual()
+            with self._trava:
+                if not self._ativos:
+                    self._thread = None
+                    return
+                for span in self._ativos:
+                    span._pico = max(span._pico, rss)
+
+    def _apos_fork(self):
+        # O processo filho não herda a thread de amostragem
+        self._ativos = set()
+        self._trava = threading.Lock()
+        self._thread = None
+
+
+_amostrador = _AmostradorMemoria()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_amostrador._apos_fork)
+
+
+def _pilha():
+    if not hasattr(_local, 'pilha'):
+        _local.pilha = []
+    return _local.pilha
+
+
+def span_atual():
+    """Span aberto mais interno da thread atual (None fora de qualquer span)."""
+    pilha = _pilha()
+    return pilha[-1] if pilha else None
+
+
+def contar_linhas(objeto, _nivel=0):
+    """Linhas de um DataFrame ou a soma das linhas dos DataFrames de uma lista, tupla ou dicionário (None se não houver)."""
+    if hasattr(objeto, 'shape') and hasattr(objeto, 'columns'):
+        return int(objeto.shape[0])
+    if _nivel < 2 and isinstance(objeto, (dict, list, tuple)):
+        itens = objeto.values() if isinstance(objeto, dict) else objeto
+        contagens = [n for n in (contar_linhas(item, _nivel + 1) for item in itens) if n is not None]
+        return sum(contagens) if contagens else None
+    return None
+
+
+def _emitir(span, eventos):
+    """Envia os eventos pelo progress_callback mais próximo (o do span ou de um span acima) que tenha evento()."""
+    while span is not None:
+        emissor = getattr(span.progress_callback, 'evento', None)
+        if emissor is not None:
+            for evento in eventos:
+                emissor(evento)
+            return
+        span = span.pai
+
+
+def incorporar_eventos(eventos):
+    """
+    Junta ao span atual eventos medidos em outra thread ou processo (ex.: nós do executor em
+    grafo): os de primeiro nível viram filhos do span atual e todos são emitidos a partir daqui.
+    """
+    atual = span_atual()
+    if atual is None:
+        return
+    ids = {evento['id'] for evento in eventos}
+    for evento in eventos:
+        if evento['pai'] not in ids:
+            evento['pai'] = atual.id
+    atual.eventos.extend(eventos)
+    _emitir(atual, eventos)
+
+
+class Span:
+    """
+    Mede um trecho de código:
+
+        with Span("Consolidação", progress_callback, linhas_entrada=len(df)) as span:
+            resultado = consolidar(df)
+            span.linhas_saida = len(resultado)
+
+    Um span aberto dentro de outro (na mesma thread) é filho dele. Ao terminar, o evento é
+    enviado pelo progress_callback mais próximo e guardado em `eventos` do span e de todos
+    os spans acima, então o mais externo acumula as medições da execução inteira.
+    O tempo de CPU é o da thread que executou o trecho.
+    """
+
+    def __init__(self, nome, progress_callback=None, linhas_entrada=None):
+        self.nome = nome
+        self.progress_callback = progress_callback
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.eventos = []
+        self.segundos = None
+        self.pai = None
+        self.id = None
+
+    def __enter__(self):
+        pilha = _pilha()
+        self.pai = pilha[-1] if pilha else None
+        self.id = f"{os.getpid()}-{next(_contador)}"
+        pilha.append(self)
+        self._inicio_epoca = time.time()
+        self._rss_inicial = rss_atual()
+        if self._rss_inicial is not None:
+            self._pico = self._rss_inicial
+            _amostrador.registrar(self)
+        self._cpu_inicial = time.thread_time()
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, erro, rastreamento):
+        self.segundos = time.perf_counter() - self._inicio
+        cpu = time.thread_time() - self._cpu_inicial
+        memoria = None
+        if self._rss_inicial is not None:
+            _amostrador.remover(self)
+            memoria = (max(self._pico, rss_atual()) - self._rss_inicial) / MB
+        _pilha().pop()
+        evento = {
+            'id': self.id,
+            'pai': self.pai.id if self.pai is not None else None,
+            'nome': self.nome,
+            'inicio': self._inicio_epoca,
+            'segundos': self.segundos,
+            'cpu_segundos': cpu,
+            'linhas_entrada': self.linhas_entrada,
+            'linhas_saida': self.linhas_saida,
+            'memoria_mb': memoria,
+            'pid': os.getpid(),
+            'thread': threading.get_ident(),
+        }
+        if tipo is not None:
+            evento['erro'] = tipo.__name__
+        self.eventos.append(evento)
+        _emitir(self, [evento])
+        if self.pai is not None:
+            self.pai.eventos.extend(self.eventos)
+        return False
+
+
+def instrumentado(funcao=None, *, nome=None):
+    """
+    Decorador: cada chamada roda dentro de um Span com o nome da função. As linhas de entrada
+    são as dos DataFrames recebidos (contadas antes da chamada, que pode alterá-los) e as de
+    saída, as do resultado.
+    """
+    def decorar(funcao):
+        rotulo = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            with Span(rotulo, linhas_entrada=contar_linhas(list(args) + list(kwargs.values()))) as span:
+                resultado = funcao(*args, **kwargs)
+                span.linhas_saida = contar_linhas(resultado)
+                return resultado
+        return envoltorio
+    return decorar(funcao) if funcao is not None else decorar
+
+
+def execucao_instrumentada(nome, prefixo_arquivo):
+    """
+    Decorador dos pontos de entrada run_*(file_path, progress_callback, ...): a execução inteira
+    vira o span raiz. Na execução mais externa, as medições são gravadas em arquivo se a seção
+    [Instrumentacao] do config.ini pedir (exportar = json ou chrome).
+    """
+    def decorar(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(file_path, progress_callback, *args, **kwargs):
+            raiz = span_atual() is None
+            with Span(nome, progress_callback) as span:
+                resultado = funcao(file_path, progress_callback, *args, **kwargs)
+            if raiz:
+                _exportar_configurado(span.eventos, prefixo_arquivo, file_path, progress_callback)
+            return resultado
+        return envoltorio
+    return decorar
+
+
+def configuracao_instrumentacao(config):
+    """Lê a seção [Instrumentacao] do config.ini, com valores padrão caso ela não exista."""
+    secao = config['Instrumentacao'] if config.has_section('Instrumentacao') else {}
+    exportar = str(secao.get('exportar', 'nao')).strip().lower()
+    if exportar not in FORMATOS_EXPORTACAO and exportar not in ('nao', 'não', ''):
+        raise ValueError(f"Valor '{exportar}' inválido para 'exportar' em [Instrumentacao]. Use: nao, {', '.join(FORMATOS_EXPORTACAO)}.")
+    return {
+        'exportar': exportar if exportar in FORMATOS_EXPORTACAO else None,
+        'diretorio': secao.get('diretorio', 'Medicoes'),
+    }
+
+
+def _nome_arquivo(texto):
+    texto = ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in texto)
+
+
+def _exportar_configurado(eventos, prefixo_arquivo, file_path, progress_callback):
+    from core.leitura_planilha import carregar_config
+    try:
+        opcoes = configuracao_instrumentacao(carregar_config())
+        if opcoes['exportar'] is None:
+            return
+        planilha = _nome_arquivo(os.path.splitext(os.path.basename(str(file_path)))[0])
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        caminho = os.path.join(opcoes['diretorio'], f"Medicoes_{prefixo_arquivo}_{planilha}_{timestamp}{FORMATOS_EXPORTACAO[opcoes['exportar']]}")
+        exportar_medicoes(eventos, caminho, opcoes['exportar'])
+        progress_callback.emit(f"Medições das etapas gravadas em '{caminho}'.")
+    except (OSError, ValueError) as e:
+        # As medições são auxiliares: uma falha aqui não muda o resultado da execução
+        progress_callback.emit(f"AVISO: não foi possível gravar as medições das etapas: {e}")
+
+
+def eventos_chrome_trace(eventos):
+    """Converte os eventos para o formato Trace Event (chrome://tracing, ui.perfetto.dev)."""
+    inicio = min((evento['inicio'] for evento in eventos), default=0)
+    trace = []
+    for evento in eventos:
+        trace.append({
+            'name': evento['nome'],
+            'cat': 'nexus',
+            'ph': 'X',
+            'ts': round((evento['inicio'] - inicio) * 1e6),
+            'dur': round(evento['segundos'] * 1e6),
+            'pid': evento['pid'],
+            'tid': evento['thread'],
+            'args': {chave: evento[chave] for chave in ('cpu_segundos', 'linhas_entrada', 'linhas_saida', 'memoria_mb', 'erro') if chave in evento},
+        })
+    return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+
+def exportar_medicoes(eventos, caminho, formato='json'):
+    """Grava os eventos em JSON (lista de eventos) ou no formato Chrome trace."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    conteudo = eventos_chrome_trace(eventos) if formato == 'chrome' else {'eventos': eventos}
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(conteudo, arquivo, ensure_ascii=False, indent=1)
+    return caminho
+
+
+def resumo_medicoes(eventos):
+    """
+    Tabela de resumo: uma linha por etapa, na ordem de início, com o nível de aninhamento.
+    Etapas com o mesmo nome sob o mesmo caminho são somadas (ex.: chamadas repetidas);
+    a memória é o maior acréscimo entre elas.
+    """
+    por_id = {evento['id']: evento for evento in eventos}
+
+    def caminho(evento):
+        nomes = []
+        while evento is not None:
+            nomes.append(evento['nome'])
+            evento = por_id.get(evento['pai'])
+        return tuple(reversed(nomes))
+
+    linhas = {}
+    for evento in sorted(eventos, key=lambda e: e['inicio']):
+        chave = caminho(evento)
+        linha = linhas.setdefault(chave, {
+            'nome': evento['nome'], 'nivel': len(chave) - 1, 'execucoes': 0, 'segundos': 0.0, 'cpu_segundos': 0.0,
+            'linhas_entrada': None, 'linhas_saida': None, 'memoria_mb': None, 'erro': False,
+        })
+        linha['execucoes'] += 1
+        linha['segundos'] += evento['segundos']
+        linha['cpu_segundos'] += evento['cpu_segundos']
+        for campo in ('linhas_entrada', 'linhas_saida'):
+            if evento[campo] is not None:
+                linha[campo] = (linha[campo] or 0) + evento[campo]
+        if evento['memoria_mb'] is not None:
+            linha['memoria_mb'] = max(linha['memoria_mb'] or 0.0, evento['memoria_mb'])
+        linha['erro'] = linha['erro'] or 'erro' in evento
+    return list(linhas.values())
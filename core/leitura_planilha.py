@@ -0,0 +1,259 @@
+# Arquivo: core/leitura_planilha.py
+# Carregador compartilhado: abre a planilha uma única vez e entrega DataFrames prontos
+import configparser
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.api.types import is_integer_dtype
+from pandas.io.parsers import TextParser
+
+# Códigos de erro do Excel que o pandas converte para NaN ao ler a planilha
+CODIGOS_ERRO_EXCEL = {'#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A'}
+
+
+class PlanilhaInvalidaError(Exception):
+    """Erro de estrutura da planilha: aba ou coluna obrigatória ausente."""
+
+
+def carregar_config(caminho='config.ini'):
+    """Lê o arquivo de configuração com os nomes de abas e colunas."""
+    config = configparser.ConfigParser()
+    config.read(caminho, encoding='utf-8')
+    return config
+
+
+VALORES_VERDADEIROS = ('sim', 'true', '1', 'yes')
+VALORES_FALSOS = ('nao', 'não', 'false', '0', 'no')
+
+
+def ler_booleano(secao, chave, padrao):
+    """
+    Lê uma opção sim/não de uma seção do config.ini (ou de um dict vazio, se a seção não
+    existir). Valores fora de VALORES_VERDADEIROS/VALORES_FALSOS são erro, não 'não'.
+    """
+    valor = secao.get(chave)
+    if valor is None or not str(valor).strip():
+        return padrao
+    valor = str(valor).strip().lower()
+    if valor in VALORES_VERDADEIROS:
+        return True
+    if valor in VALORES_FALSOS:
+        return False
+    raise ValueError(f"Valor '{valor}' inválido para '{chave}' no config.ini. Use sim ou nao.")
+
+
+def mesclar_especificacoes(*especificacoes):
+    """
+    Une especificações de leitura de vários processos para que a planilha
+    seja lida uma única vez. Cada chave recebe a união das colunas pedidas.
+    """
+    resultado = {}
+    for especificacao in especificacoes:
+        for chave, espec in especificacao.items():
+            if chave not in resultado:
+                resultado[chave] = {
+                    'aba': espec['aba'],
+                    'obrigatorias': list(espec.get('obrigatorias', [])),
+                    'opcionais': list(espec.get('opcionais', [])),
+                    'todas': espec.get('todas', False),
+                    'tipos': dict(espec.get('tipos', {})),
+                }
+                continue
+            atual = resultado[chave]
+            if atual['aba'] != espec['aba']:
+                raise ValueError(f"Chave '{chave}' aponta para abas diferentes: '{atual['aba']}' e '{espec['aba']}'.")
+            for tipo in ('obrigatorias', 'opcionais'):
+                for col in espec.get(tipo, []):
+                    if col not in atual[tipo]:
+                        atual[tipo].append(col)
+            atual['todas'] = atual['todas'] or espec.get('todas', False)
+            for col, tipo in espec.get('tipos', {}).items():
+                if atual['tipos'].setdefault(col, tipo) != tipo:
+                    raise ValueError(f"Coluna '{col}' da aba '{espec['aba']}' com tipos conflitantes: '{atual['tipos'][col]}' e '{tipo}'.")
+    return resultado
+
+
+def _ler_cabecalho(ws):
+    """Lê apenas a primeira linha da aba (não percorre o restante do XML)."""
+    ws.reset_dimensions()
+    for row in ws.iter_rows(min_row=1, max_row=1, values_only=True):
+        return list(row)
+    return []
+
+
+def validar_estrutura(wb, especificacao):
+    """
+    Confere abas e cabeçalhos a partir do workbook já aberto.
+    Retorna os cabeçalhos lidos por chave; levanta PlanilhaInvalidaError se algo faltar.
+    """
+    cabecalhos = {}
+    for chave, espec in especificacao.items():
+        aba = espec['aba']
+        if aba not in wb.sheetnames:
+            raise PlanilhaInvalidaError(f"Aba necessária '{aba}' não encontrada na planilha.")
+        cabecalho = _ler_cabecalho(wb[aba])
+        faltantes = [col for col in espec.get('obrigatorias', []) if col not in cabecalho]
+        if faltantes:
+            lista = ', '.join(f"'{col}'" for col in faltantes)
+            raise PlanilhaInvalidaError(f"Aba '{aba}' não contém a(s) coluna(s) essencial(is): {lista}.")
+        cabecalhos[chave] = cabecalho
+    return cabecalhos
+
+
+def _converter_celula(valor):
+    """Mesma conversão aplicada pelo pandas.read_excel (engine openpyxl)."""
+    if valor is None:
+        return ''
+    if isinstance(valor, float):
+        return int(valor) if valor.is_integer() else valor
+    if isinstance(valor, str) and valor in CODIGOS_ERRO_EXCEL:
+        return np.nan
+    return valor
+
+
+def _indices_colunas(cabecalho, espec):
+    """Posições (na linha da planilha) das colunas pedidas pela especificação."""
+    if espec.get('todas'):
+        return list(range(len(cabecalho)))
+    pedidas = list(espec.get('obrigatorias', [])) + list(espec.get('opcionais', []))
+    return [cabecalho.index(col) for col in pedidas if col in cabecalho]
+
+
+def _iterar_linhas(ws, indices):
+    """
+    Gera as linhas de dados já convertidas, só com as colunas em `indices`.
+    Linhas vazias no meio são mantidas (como no read_excel); as do final são descartadas.
+    """
+    ws.reset_dimensions()
+    vazias_pendentes = 0
+    for row in ws.iter_rows(min_row=2, values_only=True):
+        if not any(v is not None and v != '' for v in row):
+            vazias_pendentes += 1
+            continue
+        for _ in range(vazias_pendentes):
+            yield [''] * len(indices)
+        vazias_pendentes = 0
+        largura = len(row)
+        yield [_converter_celula(row[i]) if i < largura else '' for i in indices]
+
+
+def _ler_aba(ws, cabecalho, espec):
+    """Percorre a aba uma vez e monta o DataFrame só com as colunas pedidas."""
+    indices = _indices_colunas(cabecalho, espec)
+    nomes = [_converter_celula(cabecalho[i]) for i in indices]
+    linhas = list(_iterar_linhas(ws, indices))
+
+    if espec.get('todas'):
+        # Remove colunas finais sem cabeçalho e sem nenhum valor, como o read_excel faz
+        while nomes and nomes[-1] == '' and all(linha[len(nomes) - 1] == '' for linha in linhas):
+            nomes.pop()
+            for linha in linhas:
+                linha.pop()
+
+    parser = TextParser([nomes] + linhas, header=0, skip_blank_lines=False)
+    return parser.read()
+
+
+def ler_aba_em_blocos(ws, cabecalho, espec, tamanho_bloco):
+    """
+    Versão em blocos de _ler_aba: gera DataFrames de até `tamanho_bloco` linhas, sem
+    nunca manter a aba inteira na memória. A inferência de tipos é feita por bloco,
+    então quem consome deve normalizar as colunas que agrega (datas e números).
+    """
+    indices = _indices_colunas(cabecalho, espec)
+    nomes = [_converter_celula(cabecalho[i]) for i in indices]
+    bloco = []
+    for linha in _iterar_linhas(ws, indices):
+        bloco.append(linha)
+        if len(bloco) >= tamanho_bloco:
+            yield TextParser([nomes] + bloco, header=0, skip_blank_lines=False).read()
+            bloco = []
+    if bloco:
+        yield TextParser([nomes] + bloco, header=0, skip_blank_lines=False).read()
+
+
+def _categorias_compartilhadas(colunas):
+    """Dicionário único de categorias (ordenado) para colunas de várias abas."""
+    valores = pd.Index([])
+    for col in colunas:
+        unicos = col.cat.categories if isinstance(col.dtype, pd.CategoricalDtype) else pd.Index(col.dropna().unique())
+        valores = valores.append(unicos)
+    valores = valores.unique()
+    try:
+        valores = valores.sort_values()
+    except TypeError:
+        # Tipos misturados (ex.: números e textos) não têm ordem natural
+        pass
+    return pd.CategoricalDtype(valores)
+
+
+def aplicar_tipos(dados, especificacao):
+    """
+    Aplica o esquema de tipos declarado em cada aba ('tipos': {coluna: tipo}):
+      - 'categoria:<dominio>': categórica; colunas do mesmo domínio em abas diferentes
+        compartilham o mesmo dicionário, então merges e groupbys usam os códigos inteiros;
+      - 'numero': inteiros são reduzidos ao menor tipo sem perda. Valores com casas
+        decimais continuam float64 para que as somas não mudem;
+      - 'data': datetime64, convertido uma única vez na carga.
+    É idempotente: reaplicar só reunifica os dicionários (ex.: após leitura parcial do cache).
+    """
+    dominios = {}
+    for chave, espec in especificacao.items():
+        df = dados[chave]
+        for coluna, tipo in espec.get('tipos', {}).items():
+            if coluna not in df.columns:
+                continue
+            if tipo.startswith('categoria:'):
+                dominios.setdefault(tipo, []).append((chave, coluna))
+            elif tipo == 'numero':
+                if is_integer_dtype(df[coluna]):
+                    df[coluna] = pd.to_numeric(df[coluna], downcast='integer')
+            elif tipo == 'data':
+                df[coluna] = pd.to_datetime(df[coluna])
+            else:
+                raise ValueError(f"Tipo desconhecido '{tipo}' para a coluna '{coluna}'.")
+    for membros in dominios.values():
+        dtype = _categorias_compartilhadas([dados[chave][coluna] for chave, coluna in membros])
+        for chave, coluna in membros:
+            dados[chave][coluna] = dados[chave][coluna].astype(dtype)
+    return dados
+
+
+def ler_abas(file_path, especificacao, progress_callback=None):
+    """
+    Abre a planilha uma única vez em modo somente leitura, valida abas e cabeçalhos
+    e lê apenas as colunas pedidas, sem aplicar tipos. Retorna {chave: DataFrame}.
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        cabecalhos = validar_estrutura(wb, especificacao)
+        if progress_callback is not None:
+            progress_callback.emit("Planilha validada com sucesso.")
+        dados = {}
+        for chave, espec in especificacao.items():
+            dados[chave] = _ler_aba(wb[espec['aba']], cabecalhos[chave], espec)
+            if progress_callback is not None:
+                progress_callback.emit(f"Aba '{espec['aba']}' carregada ({len(dados[chave])} linhas).")
+        return dados
+    finally:
+        wb.close()
+
+
+def carregar_planilha(file_path, especificacao, progress_callback=None):
+    """Lê as abas (ler_abas) e aplica o esquema de tipos de cada uma."""
+    return aplicar_tipos(ler_abas(file_path, especificacao, progress_callback), especificacao)
+
+
+def validar_planilha(file_path, especificacao):
+    """Valida só a estrutura (abas e cabeçalhos), sem ler os dados. Retorna (ok, mensagem)."""
+    try:
+        wb = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        try:
+            validar_estrutura(wb, especificacao)
+        finally:
+            wb.close()
+        return True, ""
+    except PlanilhaInvalidaError as e:
+        return False, str(e)
+    except Exception as e:
+        return False, f"Erro ao validar a planilha: {e}"
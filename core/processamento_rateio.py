@@ -3,37 +3,111 @@
 import os
 import pandas as pd
 import numpy as np
-from datetime import datetime
-import configparser
+from functools import partial
+from core.leitura_planilha import PlanilhaInvalidaError, aplicar_tipos, carregar_config, validar_planilha
+from core.cache_planilha import (
+    aplicar_limite_cache, caminhos_entradas, carregar_aba_com_cache, carregar_planilha_com_cache, configuracao_cache,
+    entrada_em_cache,
+)
+from core.executor_dag import configuracao_paralelismo, executar_grafo, no
+from core.exportacao import ajustar_extensao, caminho_saida_padrao, exportar, formato_configurado
+from core.instrumentacao import execucao_instrumentada, instrumentado
 
-def validar_planilha_rateio(file_path):
-    """Verifica se a planilha contém as abas e colunas necessárias para o processo de rateio."""
-    try:
-        xls = pd.ExcelFile(file_path)
-        abas_necessarias = ['Controle de Radios', 'Controle de Componentes', 'Controle Solicitações (488 Tot)']
-        for aba in abas_necessarias:
-            if aba not in xls.sheet_names:
-                return False, f"Aba necessária '{aba}' não encontrada na planilha."
-        
-        df_radios_cols = pd.read_excel(file_path, sheet_name='Controle de Radios', nrows=0).columns
-        if 'Gerência' not in df_radios_cols or 'Valor' not in df_radios_cols:
-            return False, "Aba 'Controle de Radios' não contém as colunas 'Gerência' e/ou 'Valor'."
+# Chave de agrupamento do rateio: uma linha do resultado por (Gerência, Centro de custo)
+CHAVES_GRUPO = ['Gerência', 'Centro de custo']
+# Data de corte original do rateio ("corte de fevereiro")
+DATA_CORTE_PADRAO = pd.Timestamp("2024-02-01")
 
-        df_budget_cols = pd.read_excel(file_path, sheet_name='Controle Solicitações (488 Tot)', nrows=0).columns
-        if 'Gerencia Padronizada' not in df_budget_cols:
-            return False, "Aba 'Controle Solicitações (488 Tot)' não contém a coluna 'Gerencia Padronizada'."
+def especificacao_rateio(config):
+    """
+    Abas, colunas e tipos lidos pelo rateio (nomes das abas vêm do config.ini).
+    Chaves do mesmo domínio (ex.: gerência) compartilham o dicionário de categorias
+    entre as abas, então os merges da consolidação comparam códigos inteiros.
+    """
+    tipos_comuns = {
+        'Gerência': 'categoria:gerencia',
+        'Centro de custo': 'categoria:centro_custo',
+        'Atividade': 'categoria:atividade',
+        'Data': 'data',
+        'Valor': 'numero',
+        'Quantidade': 'numero',
+    }
+    return {
+        'radios': {
+            'aba': config['Abas']['controle_radios'],
+            'obrigatorias': ['ID do rádio', 'Gerência', 'Centro de custo', 'Atividade', 'Data', 'Valor'],
+            # Se existir, 'Quantidade' muda a agregação de processar_generic
+            'opcionais': ['Quantidade'],
+            'tipos': {'ID do rádio': 'categoria:radio', **tipos_comuns},
+        },
+        'componentes': {
+            'aba': config['Abas']['controle_componentes'],
+            'obrigatorias': ['Gerência', 'Centro de custo', 'Equipamento', 'Atividade', 'Quantidade', 'Valor', 'Data'],
+            'tipos': {'Equipamento': 'categoria:equipamento', **tipos_comuns},
+        },
+        'budget': {
+            'aba': config['Abas']['controle_solicitacoes'],
+            'obrigatorias': ['Gerencia Padronizada', 'Valor'],
+            'tipos': {'Gerencia Padronizada': 'categoria:gerencia', 'Valor': 'numero'},
+        },
+    }
 
-        return True, ""
-    except Exception as e:
-        return False, f"Erro ao validar a planilha: {e}"
+def periodo_rateio(mes_inicial=None, mes_final=None, data_corte=None):
+    """
+    Parâmetros de período do rateio. Sem meses vale o comportamento original: ressarcimentos
+    e instalações do mês corrente (de qualquer ano) e o estado dos rádios com todas as linhas.
+    Com meses ('2025-03'), o estado dos rádios e das baterias é o do fim de mes_final e os
+    ressarcimentos/instalações são os de mes_inicial a mes_final; linhas sem data ficam de fora.
+    data_corte (só a data, sem hora) substitui a data do corte de fevereiro.
+    """
+    corte = DATA_CORTE_PADRAO if data_corte is None else pd.Timestamp(data_corte).normalize()
+    periodo = {'inicio': None, 'fim': None, 'mes_inicial': None, 'mes_final': None, 'corte': corte, 'rotulo': None}
+    partes = []
+    if mes_inicial is not None:
+        inicial = pd.Period(mes_inicial, freq='M')
+        final = pd.Period(mes_final or mes_inicial, freq='M')
+        if final < inicial:
+            raise ValueError(f"O mês final ({final}) é anterior ao mês inicial ({inicial}).")
+        periodo.update({
+            'inicio': inicial.start_time, 'fim': (final + 1).start_time,
+            'mes_inicial': inicial.year * 100 + inicial.month, 'mes_final': final.year * 100 + final.month,
+        })
+        partes.append(str(inicial) if final == inicial else f"{inicial}_a_{final}")
+    elif mes_final is not None:
+        raise ValueError("Informe o mês inicial junto com o mês final.")
+    if corte != DATA_CORTE_PADRAO:
+        partes.append(f"corte_{corte.strftime('%Y-%m-%d')}")
+    periodo['rotulo'] = '_'.join(partes) or None
+    return periodo
 
+def recortar_periodo(dados, periodo):
+    """Abas de rádios e componentes só com as linhas até o fim do período (budget não tem data)."""
+    if periodo is None or periodo['fim'] is None:
+        return dados
+    recorte = dict(dados)
+    for chave in ('radios', 'componentes'):
+        df = dados[chave]
+        recorte[chave] = df[(pd.to_datetime(df['Data']) < periodo['fim']).to_numpy()]
+    return recorte
+
+def _no_periodo(datas, periodo):
+    """Máscara das datas de ressarcimentos/instalações: o período ou, sem ele, o mês corrente."""
+    if periodo is None or periodo['inicio'] is None:
+        return (datas.dt.month == pd.Timestamp.now().month).to_numpy()
+    return ((datas >= periodo['inicio']) & (datas < periodo['fim'])).to_numpy()
+
+def validar_planilha_rateio(file_path):
+    """Verifica se a planilha contém as abas e colunas necessárias para o processo de rateio."""
+    return validar_planilha(file_path, especificacao_rateio(carregar_config()))
+
+@instrumentado
 def processar_sumario_radios(df):
     df['Data'] = pd.to_datetime(df['Data'])
     df.dropna(subset=['ID do rádio', 'Gerência', 'Centro de custo'], inplace=True)
     df_latest = df.sort_values('Data').drop_duplicates(subset='ID do rádio', keep='last')
     df_filtered = df_latest[df_latest['Atividade'].isin(['Entrega', 'Devolução'])].copy()
-    pivot = pd.pivot_table(df_filtered, index=['Gerência', 'Centro de custo'], columns='Atividade', values='Valor', aggfunc='sum', fill_value=0)
-    pivot_qtd = pd.pivot_table(df_filtered, index=['Gerência', 'Centro de custo'], columns='Atividade', values='ID do rádio', aggfunc='count', fill_value=0)
+    pivot = pd.pivot_table(df_filtered, index=CHAVES_GRUPO, columns='Atividade', values='Valor', aggfunc='sum', fill_value=0, observed=True)
+    pivot_qtd = pd.pivot_table(df_filtered, index=CHAVES_GRUPO, columns='Atividade', values='ID do rádio', aggfunc='count', fill_value=0, observed=True)
     df_summary = pd.concat([pivot_qtd, pivot], axis=1)
     for col in ['Devolução', 'Entrega']:
         if col not in df_summary:
@@ -42,56 +116,145 @@ def processar_sumario_radios(df):
     df_summary.rename(columns={'Entrega Qtd': 'Qtd_Radios_Atual', 'Entrega Valor': 'Valor_Radios_Atual'}, inplace=True)
     return df_summary.reset_index()
 
-def processar_corte_fevereiro(df):
+@instrumentado
+def processar_corte_fevereiro(df, data_corte=None):
     df['Data'] = pd.to_datetime(df['Data'])
     df_latest = df.sort_values('Data').drop_duplicates(subset='ID do rádio', keep='last')
-    data_corte = pd.to_datetime("2024-02-01")
+    data_corte = DATA_CORTE_PADRAO if data_corte is None else data_corte
     df_corte = df_latest[(df_latest['Atividade'] == 'Entrega') & (df_latest['Data'] < data_corte)]
-    df_summary_corte = df_corte.groupby('Gerência').agg(
+    df_summary_corte = df_corte.groupby('Gerência', observed=True).agg(
         Qtd_Radios_Corte_Fevereiro=('ID do rádio', 'count'),
         Valor_Radios_Corte_Fevereiro=('Valor', 'sum')
     ).reset_index()
     return df_summary_corte
 
+@instrumentado
 def processar_baterias(df):
     df_baterias = df[df['Equipamento'] == 'Bateria'].copy()
-    pivot = pd.pivot_table(df_baterias, index=['Gerência', 'Centro de custo'], columns='Atividade', values=['Quantidade', 'Valor'], aggfunc='sum', fill_value=0)
+    pivot = pd.pivot_table(df_baterias, index=CHAVES_GRUPO, columns='Atividade', values=['Quantidade', 'Valor'], aggfunc='sum', fill_value=0, observed=True)
     pivot.columns = ['_'.join(col).strip() for col in pivot.columns.values]
     return pivot.reset_index()
 
+@instrumentado
 def processar_budget(df):
-    df_summary_budget = df.groupby('Gerencia Padronizada').agg(
+    df_summary_budget = df.groupby('Gerencia Padronizada', observed=True).agg(
         Qtd_Radios_Budget=('Gerencia Padronizada', 'count'),
         Valor_Radios_Budget=('Valor', 'sum')
     ).reset_index().rename(columns={'Gerencia Padronizada': 'Gerência'})
     return df_summary_budget
 
-def processar_generic(df, tipo_atividade, nome_col_sufixo):
+@instrumentado
+def processar_generic(df, tipo_atividade, nome_col_sufixo, periodo=None):
     df['Data'] = pd.to_datetime(df['Data'])
-    df_filtered = df[(df['Atividade'] == tipo_atividade) & (df['Data'].dt.month == pd.Timestamp.now().month)].copy()
+    df_filtered = df[(df['Atividade'] == tipo_atividade).to_numpy() & _no_periodo(df['Data'], periodo)].copy()
     agg_dict = {'Valor': 'sum'}
     if 'Quantidade' in df.columns:
         agg_dict['Quantidade'] = 'sum'
     else:
         agg_dict['ID do rádio'] = 'count'
-    summary = df_filtered.groupby(['Gerência', 'Centro de custo']).agg(agg_dict).reset_index()
+    summary = df_filtered.groupby(CHAVES_GRUPO, observed=True).agg(agg_dict).reset_index()
+    return renomear_generic(summary, nome_col_sufixo)
+
+def renomear_generic(summary, nome_col_sufixo):
+    """Mesmos nomes de colunas que processar_generic produz."""
     rename_map = {'Valor': f'Valor_{nome_col_sufixo}'}
     if 'Quantidade' in summary.columns:
         rename_map['Quantidade'] = f'Qtd_{nome_col_sufixo}'
     if 'ID do rádio' in summary.columns:
         rename_map['ID do rádio'] = f'Qtd_{nome_col_sufixo}'
-    summary.rename(columns=rename_map, inplace=True)
-    return summary
+    return summary.rename(columns=rename_map)
+
+def montar_sumario_radios(agregado):
+    """Sumário de rádios a partir de Qtd e Valor por (Gerência, Centro de custo, Atividade)."""
+    agregado = agregado.unstack('Atividade', fill_value=0)
+    df_summary = pd.DataFrame(index=agregado.index)
+    for medida, sufixo in [('Qtd', 'Qtd'), ('Valor', 'Valor')]:
+        for atividade in ['Devolução', 'Entrega']:
+            if (medida, atividade) in agregado.columns:
+                df_summary[f'{atividade} {sufixo}'] = agregado[(medida, atividade)]
+            else:
+                df_summary[f'{atividade} {sufixo}'] = 0
+    df_summary.columns.name = None
+    df_summary.rename(columns={'Entrega Qtd': 'Qtd_Radios_Atual', 'Entrega Valor': 'Valor_Radios_Atual'}, inplace=True)
+    return df_summary.reset_index()
+
+@instrumentado
+def agregar_radios(df, periodo=None):
+    """
+    Etapa unificada da aba de rádios: converte 'Data' uma única vez, ordena uma única vez
+    e produz, sem cópias da aba, os mesmos resultados de processar_sumario_radios,
+    processar_corte_fevereiro e das duas chamadas de processar_generic sobre rádios
+    (a menos do desempate entre eventos com a mesma Data, ver abaixo).
+    `periodo` (de periodo_rateio) define a data de corte e os meses de ressarcimentos e
+    instalações; o recorte das linhas até o fim do período é feito antes (recortar_periodo).
+    """
+    datas = pd.to_datetime(df['Data'])
+    ids = df['ID do rádio']
+
+    # Só as posições são ordenadas (não a aba inteira). A ordenação é estável: dois eventos
+    # do mesmo rádio na mesma Data ficam com o que aparece depois na planilha, como no modo
+    # streaming e no incremental (um subconjunto das linhas mantém a mesma ordem relativa).
+    posicoes_datas = pd.Series(datas.to_numpy())
+    validas = df[['ID do rádio', 'Gerência', 'Centro de custo']].notna().all(axis=1).to_numpy()
+
+    # Último estado de cada rádio considerando todas as linhas (corte de fevereiro)
+    ordem = posicoes_datas.sort_values(kind='stable').index.to_numpy()
+    pos_ultimo = ordem[~ids.take(ordem).duplicated(keep='last').to_numpy()]
+
+    # Último estado considerando só linhas com ID, Gerência e Centro de custo (sumário)
+    ordem_validas = posicoes_datas[validas].sort_values(kind='stable').index.to_numpy()
+    pos_ultimo_valido = ordem_validas[~ids.take(ordem_validas).duplicated(keep='last').to_numpy()]
+
+    resultados = {}
+
+    # Sumário: contagem e valor por (Gerência, Centro de custo, Atividade) em um único groupby
+    ultimo_valido = df.take(pos_ultimo_valido)
+    ultimo_valido = ultimo_valido[ultimo_valido['Atividade'].isin(['Entrega', 'Devolução'])]
+    agregado = ultimo_valido.groupby(CHAVES_GRUPO + ['Atividade'], observed=True).agg(
+        Qtd=('ID do rádio', 'count'), Valor=('Valor', 'sum')
+    )
+    resultados['sumario_radios'] = montar_sumario_radios(agregado)
+
+    # Corte de fevereiro: entregas anteriores à data de corte no último estado de cada rádio
+    data_corte = DATA_CORTE_PADRAO if periodo is None else periodo['corte']
+    datas_ultimo = datas.take(pos_ultimo)
+    ultimo = df.take(pos_ultimo)
+    df_corte = ultimo[(ultimo['Atividade'] == 'Entrega').to_numpy() & (datas_ultimo < data_corte).to_numpy()]
+    resultados['corte_fevereiro'] = df_corte.groupby('Gerência', observed=True).agg(
+        Qtd_Radios_Corte_Fevereiro=('ID do rádio', 'count'),
+        Valor_Radios_Corte_Fevereiro=('Valor', 'sum')
+    ).reset_index()
+
+    # Ressarcimentos e instalações do mês corrente (ou do período) em um único groupby
+    atividades_mes = {'Ressarcimento': 'Ressarcimento_Radios', 'Instalação': 'Instalacao_Radios'}
+    no_mes = df['Atividade'].isin(list(atividades_mes)).to_numpy() & _no_periodo(datas, periodo)
+    agg_dict = {'Valor': 'sum'}
+    if 'Quantidade' in df.columns:
+        agg_dict['Quantidade'] = 'sum'
+    else:
+        agg_dict['ID do rádio'] = 'count'
+    agregado_mes = df[no_mes].groupby(CHAVES_GRUPO + ['Atividade'], observed=True).agg(agg_dict)
+    for atividade, sufixo in atividades_mes.items():
+        if atividade in agregado_mes.index.get_level_values('Atividade'):
+            summary = agregado_mes.xs(atividade, level='Atividade').reset_index()
+        else:
+            summary = pd.DataFrame(columns=CHAVES_GRUPO + list(agg_dict))
+        chave = 'ressarc_radios' if atividade == 'Ressarcimento' else 'instal_radios'
+        resultados[chave] = renomear_generic(summary, sufixo)
+
+    return resultados
 
+@instrumentado
 def consolidar_e_calcular_rateio(dataframes):
-    df_final = dataframes['sumario_radios']
+    # Cópia: os agregados de entrada podem ser reaproveitados (ex.: modo incremental)
+    df_final = dataframes['sumario_radios'].copy()
     dfs_to_merge = [
         (dataframes['corte_fevereiro'], 'Gerência'),
         (dataframes['budget'], 'Gerência'),
-        (dataframes['baterias'], ['Gerência', 'Centro de custo']),
-        (dataframes['ressarc_radios'], ['Gerência', 'Centro de custo']),
-        (dataframes['ressarc_comp'], ['Gerência', 'Centro de custo']),
-        (dataframes['instal_radios'], ['Gerência', 'Centro de custo']),
+        (dataframes['baterias'], CHAVES_GRUPO),
+        (dataframes['ressarc_radios'], CHAVES_GRUPO),
+        (dataframes['ressarc_comp'], CHAVES_GRUPO),
+        (dataframes['instal_radios'], CHAVES_GRUPO),
     ]
     for df_to_merge, key in dfs_to_merge:
         if not df_to_merge.empty:
@@ -123,65 +286,176 @@ def consolidar_e_calcular_rateio(dataframes):
         df_final = pd.concat([df_final, total_row_df], ignore_index=True)
     return df_final
 
-def run_full_process(file_path, progress_callback):
-    """Orquestra todo o processo de ETL, lendo configurações de um arquivo externo."""
+@instrumentado
+def agregar_dados_rateio(dados, progress_callback, periodo=None):
+    """
+    Fase 2: gera, a partir das abas carregadas, os DataFrames que a consolidação espera.
+    `periodo` (de periodo_rateio) troca o mês corrente por um mês ou intervalo e a data de corte.
+    """
+    dados = recortar_periodo(dados, periodo)
+    dfs = {}
+    progress_callback.emit("1/4 - Agregando rádios (sumário, corte de Fevereiro, ressarcimentos e instalações)...")
+    dfs.update(agregar_radios(dados['radios'], periodo))
+    progress_callback.emit("2/4 - Processando dados de Baterias...")
+    dfs['baterias'] = processar_baterias(dados['componentes'])
+    progress_callback.emit("3/4 - Processando dados de Budget...")
+    dfs['budget'] = processar_budget(dados['budget'])
+    progress_callback.emit("4/4 - Processando Ressarcimentos de Componentes...")
+    dfs['ressarc_comp'] = processar_generic(dados['componentes'].copy(), 'Ressarcimento', 'Ressarcimento_Componentes', periodo)
+    return dfs
+
+def comparar_rateios(a, b, tolerancia=None):
+    """
+    Compara dois rateios consolidados e retorna (iguais, primeira linha da diferença).
+    As chaves viram object (dicionários de categorias podem diferir). tolerancia=None exige
+    igualdade exata; um número é a tolerância relativa dos valores (contagens, linhas e
+    colunas continuam tendo de ser iguais).
+    """
+    a = a.copy()
+    b = b.copy()
+    for df in (a, b):
+        for col in CHAVES_GRUPO:
+            df[col] = df[col].astype(object)
+    if tolerancia is None:
+        opcoes = {'check_exact': True}
+    else:
+        opcoes = {'check_exact': False, 'rtol': tolerancia, 'atol': 1e-6}
     try:
-        # Lendo o arquivo de configuração
-        config = configparser.ConfigParser()
-        config.read('config.ini', encoding='utf-8')
-        
-        # Nomes das abas a partir do config
-        aba_radios = config['Abas']['controle_radios']
-        aba_componentes = config['Abas']['controle_componentes']
-        aba_budget = config['Abas']['controle_solicitacoes']
-        
-        # ETAPA DE VALIDAÇÃO (agora também usa o config)
-        progress_callback.emit("--- Validando estrutura da planilha... ---")
-        # A função de validação agora precisará dos nomes do config, então a integramos aqui
-        xls = pd.ExcelFile(file_path)
-        for aba in [aba_radios, aba_componentes, aba_budget]:
-            if aba not in xls.sheet_names:
-                progress_callback.emit(f"ERRO DE VALIDAÇÃO: Aba necessária '{aba}' não encontrada.")
+        pd.testing.assert_frame_equal(a, b, check_dtype=False, check_categorical=False, **opcoes)
+        return True, ""
+    except AssertionError as e:
+        return False, str(e).splitlines()[0]
+
+def _abas_tipadas(especificacao, *abas):
+    """Junta as abas lidas separadamente e reunifica os dicionários de categorias."""
+    return aplicar_tipos(dict(zip(especificacao, abas)), especificacao)
+
+def _agregar_aba(funcao, chave, dados):
+    return funcao(dados[chave])
+
+def _ressarcimentos_componentes(dados, periodo=None):
+    return processar_generic(dados['componentes'].copy(), 'Ressarcimento', 'Ressarcimento_Componentes', periodo)
+
+def _consolidar_agregados(radios, baterias, budget, ressarc_comp):
+    return consolidar_e_calcular_rateio({**radios, 'baterias': baterias, 'budget': budget, 'ressarc_comp': ressarc_comp})
+
+def grafo_rateio(file_path, config, usar_cache=True, carregar=True, periodo=None):
+    """
+    Fases 1 a 3 do rateio como grafo de dependências: leitura de cada aba (um processo
+    por aba) -> tipos compartilhados -> agregações independentes -> consolidação.
+    Com carregar=False o grafo começa das abas já carregadas, na entrada 'dados'.
+    Com um período com meses, as agregações partem das linhas até o fim do período.
+    """
+    nos = {}
+    if carregar:
+        especificacao = especificacao_rateio(config)
+        opcoes_cache = configuracao_cache(config)
+        caminhos = {}
+        if usar_cache and opcoes_cache['ativo']:
+            os.makedirs(opcoes_cache['diretorio'], exist_ok=True)
+            caminhos = caminhos_entradas(file_path, especificacao, opcoes_cache['diretorio'])
+        for chave, espec in especificacao.items():
+            # Só a leitura da planilha (Python puro) compensa um processo; a do cache (Arrow)
+            # roda em thread, e com todas as abas no cache nenhum processo é criado
+            nos[f'leitura_{chave}'] = no(
+                partial(carregar_aba_com_cache, file_path, chave, espec, caminhos.get(chave)),
+                processo=not entrada_em_cache(caminhos.get(chave)), rotulo=f"Leitura da aba '{espec['aba']}'",
+            )
+        nos['dados'] = no(partial(_abas_tipadas, especificacao), *[f'leitura_{chave}' for chave in especificacao],
+                          rotulo="Tipos compartilhados entre as abas")
+    origem = 'dados'
+    if periodo is not None and periodo['fim'] is not None:
+        nos['dados_periodo'] = no(partial(recortar_periodo, periodo=periodo), 'dados', rotulo="Recorte do período")
+        origem = 'dados_periodo'
+    nos['radios'] = no(partial(_agregar_aba, partial(agregar_radios, periodo=periodo), 'radios'), origem,
+                       rotulo="Rádios (sumário, corte de Fevereiro, ressarcimentos e instalações)")
+    nos['baterias'] = no(partial(_agregar_aba, processar_baterias, 'componentes'), origem, rotulo="Baterias")
+    nos['budget'] = no(partial(_agregar_aba, processar_budget, 'budget'), origem, rotulo="Budget")
+    nos['ressarc_comp'] = no(partial(_ressarcimentos_componentes, periodo=periodo), origem, rotulo="Ressarcimentos de Componentes")
+    nos['rateio'] = no(_consolidar_agregados, 'radios', 'baterias', 'budget', 'ressarc_comp', rotulo="Consolidação")
+    return nos
+
+@execucao_instrumentada('Rateio', 'Rateio')
+def run_full_process(file_path, progress_callback, dados=None, usar_cache=True, modo_streaming=False, arquivo_saida=None,
+                     incremental=False, verificar_incremental=False, paralelo=None, periodo=None):
+    """
+    Orquestra todo o processo de ETL, lendo configurações de um arquivo externo.
+    `dados` permite reaproveitar DataFrames já carregados por carregar_planilha;
+    `usar_cache=False` força a leitura da planilha mesmo que ela esteja no cache;
+    `modo_streaming=True` agrega a planilha em blocos, com memória limitada pelo
+    número de rádios e centros de custo (para planilhas que não cabem na memória);
+    `arquivo_saida` substitui o nome padrão com data e hora (usado no processamento em lote);
+    `incremental=True` recalcula só as gerências cujas linhas mudaram desde a última execução
+    sobre o mesmo arquivo, e `verificar_incremental=True` confere o resultado com um recálculo completo;
+    `paralelo` liga/desliga o executor em grafo (None = seção [Paralelismo] do config.ini);
+    `periodo` (de periodo_rateio) gera o rateio de outro mês ou intervalo, com outra data de corte.
+    Retorna a lista dos arquivos gerados (um por aba em csv/parquet) ou False em caso de erro.
+    """
+    try:
+        config = carregar_config()
+        formato = formato_configurado(config)
+        opcoes_paralelismo = configuracao_paralelismo(config)
+        if paralelo is None:
+            paralelo = opcoes_paralelismo['ativo']
+        if periodo is not None and (modo_streaming or incremental):
+            # Os modos streaming e incremental só calculam o mês corrente
+            progress_callback.emit("AVISO: período informado; o rateio será calculado no modo normal (sem streaming/incremental).")
+            modo_streaming = incremental = False
+        if modo_streaming and dados is None:
+            from core.agregacao_streaming import agregar_em_streaming
+            progress_callback.emit("--- Fases 1 e 2: Leitura em blocos e Agregação (modo streaming) ---")
+            try:
+                dfs = agregar_em_streaming(file_path, config, progress_callback)
+            except PlanilhaInvalidaError as e:
+                progress_callback.emit(f"ERRO DE VALIDAÇÃO: {e}")
                 return False
-        progress_callback.emit("Planilha validada com sucesso.")
-
-        # ... (O restante das Fases 1, 2 e 3 continua exatamente igual) ...
-        progress_callback.emit("\n--- Fase 1: Carregamento dos Dados ---")
-        df_radios = pd.read_excel(file_path, sheet_name='Controle de Radios', engine='openpyxl')
-        df_componentes = pd.read_excel(file_path, sheet_name='Controle de Componentes', engine='openpyxl')
-        df_budget = pd.read_excel(file_path, sheet_name='Controle Solicitações (488 Tot)', engine='openpyxl')
-        progress_callback.emit("Planilhas carregadas com sucesso.")
-        progress_callback.emit("\n--- Fase 2: Processamento e Agregação ---")
-        dfs = {}
-        progress_callback.emit("1/7 - Processando sumário principal de rádios...")
-        dfs['sumario_radios'] = processar_sumario_radios(df_radios.copy())
-        progress_callback.emit("2/7 - Processando dados do corte de Fevereiro...")
-        dfs['corte_fevereiro'] = processar_corte_fevereiro(df_radios.copy())
-        progress_callback.emit("3/7 - Processando dados de Baterias...")
-        dfs['baterias'] = processar_baterias(df_componentes.copy())
-        progress_callback.emit("4/7 - Processando dados de Budget...")
-        dfs['budget'] = processar_budget(df_budget.copy())
-        progress_callback.emit("5/7 - Processando Ressarcimentos de Rádios...")
-        dfs['ressarc_radios'] = processar_generic(df_radios.copy(), 'Ressarcimento', 'Ressarcimento_Radios')
-        progress_callback.emit("6/7 - Processando Ressarcimentos de Componentes...")
-        dfs['ressarc_comp'] = processar_generic(df_componentes.copy(), 'Ressarcimento', 'Ressarcimento_Componentes')
-        progress_callback.emit("7/7 - Processando Instalações de Rádios...")
-        dfs['instal_radios'] = processar_generic(df_radios.copy(), 'Instalação', 'Instalacao_Radios')
-        progress_callback.emit("\n--- Fase 3: Consolidação e Cálculos Finais ---")
-        df_rateio_final = consolidar_e_calcular_rateio(dfs)
+            progress_callback.emit("\n--- Fase 3: Consolidação e Cálculos Finais ---")
+            df_rateio_final = consolidar_e_calcular_rateio(dfs)
+        elif paralelo and not incremental:
+            # Abas lidas em paralelo e agregações independentes rodando ao mesmo tempo
+            progress_callback.emit(f"--- Fases 1 a 3: Leitura, Agregação e Consolidação em paralelo ({opcoes_paralelismo['workers']} workers) ---")
+            try:
+                resultados = executar_grafo(
+                    grafo_rateio(file_path, config, usar_cache, carregar=dados is None, periodo=periodo), progress_callback,
+                    entradas=None if dados is None else {'dados': dados},
+                    workers=opcoes_paralelismo['workers'], usar_processos=opcoes_paralelismo['processos'],
+                )
+            except PlanilhaInvalidaError as e:
+                progress_callback.emit(f"ERRO DE VALIDAÇÃO: {e}")
+                return False
+            if dados is None and usar_cache:
+                aplicar_limite_cache(config)
+            df_rateio_final = resultados['rateio']
+        else:
+            if dados is None:
+                # Validação e carregamento a partir de uma única abertura da planilha
+                progress_callback.emit("--- Fase 1: Validação e Carregamento dos Dados ---")
+                try:
+                    dados = carregar_planilha_com_cache(file_path, especificacao_rateio(config), config, progress_callback, usar_cache)
+                except PlanilhaInvalidaError as e:
+                    progress_callback.emit(f"ERRO DE VALIDAÇÃO: {e}")
+                    return False
+                progress_callback.emit("Planilhas carregadas com sucesso.")
+            progress_callback.emit("\n--- Fase 2: Processamento e Agregação ---")
+            if incremental:
+                from core.rateio_incremental import agregar_incremental
+                dfs = agregar_incremental(file_path, dados, config, progress_callback, verificar=verificar_incremental)
+            else:
+                dfs = agregar_dados_rateio(dados, progress_callback, periodo)
+            progress_callback.emit("\n--- Fase 3: Consolidação e Cálculos Finais ---")
+            df_rateio_final = consolidar_e_calcular_rateio(dfs)
         
-        # --- MELHORIA: Salvar em pasta dedicada ---
-        output_dir = "Relatorios_Rateio"
-        os.makedirs(output_dir, exist_ok=True) # Cria a pasta se não existir
+        # --- MELHORIA: Salvar em pasta dedicada (nome e formato vêm do config.ini) ---
+        if arquivo_saida is not None:
+            output_path = ajustar_extensao(arquivo_saida, formato)
+        else:
+            output_path = caminho_saida_padrao(config, 'rateio', formato, rotulo=periodo and periodo['rotulo'])
+        output_dir = os.path.dirname(output_path) or "."
 
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        file_name = f'Rateio_Final_{timestamp}.xlsx'
-        output_path = os.path.join(output_dir, file_name)
-        
         progress_callback.emit(f"\n--- Fase 4: Exportando resultado para '{output_path}' ---")
-        df_rateio_final.to_excel(output_path, index=False, sheet_name='Rateio')
+        arquivos = exportar({'Rateio': df_rateio_final}, output_path, formato)
         progress_callback.emit(f"SUCESSO: Arquivo gerado na pasta '{output_dir}'.")
-        return True
+        return arquivos
         
     except Exception as e:
         progress_callback.emit(f"\nERRO DURANTE O PROCESSAMENTO: {e}")
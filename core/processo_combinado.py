@@ -0,0 +1,93 @@
+# Arquivo: core/processo_combinado.py
+# Rotina mensal em uma única execução: Atualização Massiva e, em seguida, o Rateio
+# calculado sobre as abas de controle já atualizadas (a planilha é lida uma só vez).
+from datetime import datetime
+from core.leitura_planilha import PlanilhaInvalidaError, aplicar_tipos, carregar_config, mesclar_especificacoes
+from core.cache_planilha import carregar_planilha_com_cache
+from core.atualizacao_massiva import atualizar_controles, especificacao_atualizacao, normalize_text, salvar_controles
+from core.processamento_rateio import especificacao_rateio, run_full_process
+from core.exportacao import ajustar_extensao, caminho_saida_padrao, formato_configurado
+from core.instrumentacao import execucao_instrumentada, instrumentado
+
+
+def _aba_atualizada_para_rateio(df_original, df_atualizado, colunas):
+    """
+    Devolve a aba no formato lido pelo rateio (nomes originais das colunas), com o
+    centro de custo atualizado. Onde a gerência não foi encontrada na 'Base de Dados'
+    o centro de custo original é mantido, para a linha não sumir do rateio.
+    Retorna (DataFrame, número de linhas sem atualização).
+    """
+    # atualizar_controles padroniza os cabeçalhos com normalize_text; o caminho de volta
+    # usa a primeira coluna original de cada nome padronizado
+    originais = {}
+    for col in df_original.columns:
+        originais.setdefault(normalize_text(col), col)
+    df = df_atualizado.rename(columns={normalizado: original for normalizado, original in originais.items()})
+    df = df[[col for col in colunas if col in df.columns]].copy()
+    encontrados = (df_atualizado['status da atualizacao'] == 'Atualizado com sucesso').to_numpy()
+    df['Centro de custo'] = df_original['Centro de custo'].astype(object).where(
+        ~encontrados, df_atualizado['centro de custo'].astype(object)
+    )
+    return df, int((~encontrados).sum())
+
+
+@instrumentado
+def dados_rateio_atualizados(dados, atualizadas, config):
+    """Monta, a partir das abas de controle atualizadas, os dados que o rateio espera."""
+    abas = config['Abas']
+    especificacao = especificacao_rateio(config)
+    dados_rateio = {'budget': dados['budget'].copy()}
+    sem_atualizacao = {}
+    for chave, aba in [('radios', abas['controle_radios']), ('componentes', abas['controle_componentes'])]:
+        espec = especificacao[chave]
+        colunas = espec['obrigatorias'] + espec.get('opcionais', [])
+        dados_rateio[chave], sem_atualizacao[aba] = _aba_atualizada_para_rateio(dados[chave], atualizadas[aba], colunas)
+    # O centro de custo atualizado vem da 'Base de Dados': os dicionários de categorias são refeitos
+    return aplicar_tipos(dados_rateio, especificacao), sem_atualizacao
+
+
+@execucao_instrumentada('Atualização + Rateio', 'Combinado')
+def run_combined_process(file_path, progress_callback, usar_cache=True, arquivo_saida_atualizacao=None, arquivo_saida_rateio=None):
+    """
+    Executa a Atualização Massiva e o Rateio a partir de uma única leitura da planilha.
+    O rateio usa os centros de custo recém-atualizados. Gera os dois arquivos de resultado,
+    nas mesmas pastas dos processos separados (ou nos caminhos informados).
+    Retorna a lista dos arquivos gerados pelos dois processos ou False em caso de erro.
+    """
+    try:
+        config = carregar_config()
+        formato = formato_configurado(config)
+        progress_callback.emit("--- Fase 1: Validação e Carregamento dos Dados (leitura única) ---")
+        especificacao = mesclar_especificacoes(especificacao_rateio(config), especificacao_atualizacao(config))
+        try:
+            dados = carregar_planilha_com_cache(file_path, especificacao, config, progress_callback, usar_cache)
+        except PlanilhaInvalidaError as e:
+            progress_callback.emit(f"ERRO DE VALIDAÇÃO: {e}")
+            return False
+
+        progress_callback.emit("\n--- Fase 2: Atualização Massiva (em memória) ---")
+        atualizadas = atualizar_controles(dados, config, progress_callback)
+        # Os dois resultados com o mesmo carimbo de data e hora
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        if arquivo_saida_atualizacao is None:
+            arquivo_saida_atualizacao = caminho_saida_padrao(config, 'atualizacao', formato, timestamp)
+        if arquivo_saida_rateio is None:
+            arquivo_saida_rateio = caminho_saida_padrao(config, 'rateio', formato, timestamp)
+        arquivos = salvar_controles(atualizadas, ajustar_extensao(arquivo_saida_atualizacao, formato), formato)
+        progress_callback.emit(f"SUCESSO: Controles atualizados gravados em {', '.join(repr(a) for a in arquivos)}.")
+
+        progress_callback.emit("\n--- Fase 3: Rateio sobre os controles atualizados ---")
+        dados_rateio, sem_atualizacao = dados_rateio_atualizados(dados, atualizadas, config)
+        for aba, linhas in sem_atualizacao.items():
+            if linhas:
+                progress_callback.emit(f"AVISO: {linhas} linha(s) de '{aba}' sem gerência na 'Base de Dados' mantiveram o centro de custo original no rateio.")
+        arquivos_rateio = run_full_process(file_path, progress_callback, dados=dados_rateio, arquivo_saida=arquivo_saida_rateio)
+        return arquivos + arquivos_rateio if arquivos_rateio else False
+
+    except KeyError as e:
+        progress_callback.emit(f"\nERRO DE CHAVE: A coluna {e} não foi encontrada.")
+        progress_callback.emit("Verifique se o nome da coluna no Excel corresponde exatamente ao esperado.")
+        return False
+    except Exception as e:
+        progress_callback.emit(f"\nERRO DURANTE O PROCESSAMENTO COMBINADO: {e}")
+        return False
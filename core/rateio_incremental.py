@@ -0,0 +1,200 @@
+# Arquivo: core/rateio_incremental.py
+# Rateio incremental: entre duas execuções sobre a mesma planilha, só as gerências cujas
+# linhas de origem mudaram são recalculadas. O restante vem dos agregados da execução anterior.
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from core.processamento_rateio import (
+    CHAVES_GRUPO, agregar_dados_rateio, comparar_rateios, consolidar_e_calcular_rateio, especificacao_rateio,
+)
+from core.instrumentacao import instrumentado
+
+VERSAO_ESTADO = 1
+# Coluna de gerência de cada aba (a do budget vira 'Gerência' em processar_budget)
+COLUNA_GERENCIA = {'radios': 'Gerência', 'componentes': 'Gerência', 'budget': 'Gerencia Padronizada'}
+# Marca os rádios sem ID: para o último estado, todos eles formam um único "rádio"
+ID_VAZIO = '\x00sem-id'
+
+
+def diretorio_estado(config):
+    """Pasta dos estados incrementais, da seção [Incremental] do config.ini."""
+    if config.has_section('Incremental'):
+        return config['Incremental'].get('diretorio', '.estado_incremental')
+    return '.estado_incremental'
+
+
+def _caminho_estado(config, file_path):
+    nome = hashlib.sha256(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:32]
+    return os.path.join(diretorio_estado(config), f"{nome}.pkl")
+
+
+def _assinatura(config):
+    """Muda quando algo que afeta os agregados muda: mês corrente ou colunas lidas."""
+    texto = json.dumps({
+        'versao': VERSAO_ESTADO,
+        'mes': pd.Timestamp.now().month,
+        'espec': especificacao_rateio(config),
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+@instrumentado
+def calcular_impressoes(dados, config):
+    """
+    Impressão digital (hash de 64 bits) de cada linha, só sobre as colunas usadas pelo
+    rateio, junto com a gerência (e o ID, na aba de rádios) necessários para localizar
+    os grupos afetados.
+    """
+    especificacao = especificacao_rateio(config)
+    impressoes = {}
+    for chave, col_gerencia in COLUNA_GERENCIA.items():
+        df = dados[chave]
+        espec = especificacao[chave]
+        colunas = [c for c in espec['obrigatorias'] + espec.get('opcionais', []) if c in df.columns]
+        impressao = pd.DataFrame({
+            'hash': pd.util.hash_pandas_object(df[colunas], index=False).to_numpy(),
+            'gerencia': df[col_gerencia].astype(object).to_numpy(),
+        })
+        if chave == 'radios':
+            impressao['id'] = df['ID do rádio'].astype(object).fillna(ID_VAZIO).to_numpy()
+        impressoes[chave] = impressao
+    return impressoes
+
+
+def _hashes_alterados(antigo, novo):
+    """Hashes cuja quantidade de ocorrências mudou (linhas incluídas, removidas ou editadas)."""
+    contagem = pd.concat([
+        pd.Series(antigo['hash']).value_counts().rename('antigo'),
+        pd.Series(novo['hash']).value_counts().rename('novo'),
+    ], axis=1).fillna(0)
+    return contagem.index[contagem['antigo'] != contagem['novo']].to_numpy()
+
+
+def gerencias_afetadas(impressoes_antigas, impressoes_novas):
+    """
+    Gerências que precisam ser recalculadas: as das linhas alteradas em qualquer aba e,
+    como o último estado de um rádio pode migrar de gerência, todas as gerências em que
+    um rádio com linha alterada aparece (antes ou agora).
+    """
+    afetadas = set()
+    ids_afetados = set()
+    for chave in COLUNA_GERENCIA:
+        antigo, novo = impressoes_antigas[chave], impressoes_novas[chave]
+        alterados = _hashes_alterados(antigo, novo)
+        for impressao in (antigo, novo):
+            linhas = impressao[np.isin(impressao['hash'].to_numpy(), alterados)]
+            afetadas.update(linhas['gerencia'].dropna())
+            if chave == 'radios':
+                ids_afetados.update(linhas['id'])
+    for impressao in (impressoes_antigas['radios'], impressoes_novas['radios']):
+        afetadas.update(impressao.loc[impressao['id'].isin(ids_afetados), 'gerencia'].dropna())
+    return afetadas
+
+
+def _subconjunto(dados, afetadas):
+    """
+    Linhas suficientes para recalcular as gerências afetadas: todas as linhas de qualquer
+    rádio que aparece nelas (o último estado depende do histórico completo do rádio), os
+    rádios sem ID e as linhas de componentes/budget dessas gerências.
+    """
+    radios = dados['radios']
+    ids = radios['ID do rádio']
+    ids_relevantes = ids[radios['Gerência'].isin(afetadas)].dropna().unique()
+    mascara_radios = ids.isin(ids_relevantes) | ids.isna()
+    return {
+        'radios': radios[mascara_radios.to_numpy()],
+        'componentes': dados['componentes'][dados['componentes']['Gerência'].isin(afetadas).to_numpy()],
+        'budget': dados['budget'][dados['budget']['Gerencia Padronizada'].isin(afetadas).to_numpy()],
+    }
+
+
+def _chaves_como_objeto(dfs):
+    """Chaves categóricas viram object: os dicionários mudam de uma execução para outra."""
+    resultado = {}
+    for nome, df in dfs.items():
+        df = df.copy()
+        for col in CHAVES_GRUPO:
+            if col in df.columns:
+                df[col] = df[col].astype(object)
+        resultado[nome] = df
+    return resultado
+
+
+def _substituir_gerencias(antigo, novo, afetadas):
+    """Troca, em um agregado, as linhas das gerências afetadas pelas recalculadas."""
+    mantidas = antigo[~antigo['Gerência'].isin(afetadas)]
+    recalculadas = novo[novo['Gerência'].isin(afetadas)]
+    partes = [df for df in (mantidas, recalculadas) if not df.empty]
+    if not partes:
+        return antigo.iloc[0:0]
+    return pd.concat(partes, ignore_index=True)
+
+
+def mesclar_agregados(anteriores, parciais, afetadas):
+    """
+    Combina os agregados da execução anterior com os recalculados, deixando-os no mesmo
+    formato (ordem de linhas e colunas) que um recálculo completo produziria.
+    """
+    dfs = {nome: _substituir_gerencias(anteriores[nome], parciais[nome], afetadas) for nome in anteriores}
+    # O sumário define a ordem das linhas do rateio: a do groupby, ordenada pelas chaves
+    dfs['sumario_radios'] = dfs['sumario_radios'].sort_values(CHAVES_GRUPO, kind='stable').reset_index(drop=True)
+    # Colunas do pivot de baterias: mesma ordem ordenada do pivot_table; grupos sem a atividade valem 0
+    baterias = dfs['baterias']
+    colunas_valores = sorted(c for c in baterias.columns if c not in CHAVES_GRUPO)
+    baterias = baterias[CHAVES_GRUPO + colunas_valores]
+    dfs['baterias'] = baterias.fillna({c: 0 for c in colunas_valores})
+    return dfs
+
+
+@instrumentado
+def agregar_incremental(file_path, dados, config, progress_callback, verificar=False):
+    """
+    Fase 2 incremental. Usa o estado salvo da última execução sobre este arquivo (impressões
+    das linhas + agregados por gerência/centro de custo), recalcula só as gerências afetadas
+    e salva o novo estado. Sem estado compatível, faz o cálculo completo.
+    Com verificar=True também roda o cálculo completo e compara os dois rateios.
+    """
+    caminho = _caminho_estado(config, file_path)
+    assinatura = _assinatura(config)
+    impressoes = calcular_impressoes(dados, config)
+
+    estado = None
+    if os.path.exists(caminho):
+        try:
+            estado = pd.read_pickle(caminho)
+        except Exception:
+            estado = None
+    if estado is not None and estado.get('assinatura') != assinatura:
+        progress_callback.emit("Estado incremental de outro mês ou configuração: recálculo completo.")
+        estado = None
+
+    if estado is None:
+        progress_callback.emit("Sem execução anterior compatível: cálculo completo.")
+        dfs = _chaves_como_objeto(agregar_dados_rateio(dados, progress_callback))
+    else:
+        afetadas = gerencias_afetadas(estado['impressoes'], impressoes)
+        total = len(set(impressoes['radios']['gerencia'].dropna()) | set(estado['impressoes']['radios']['gerencia'].dropna()))
+        progress_callback.emit(f"Modo incremental: {len(afetadas)} de {total} gerência(s) com linhas alteradas.")
+        if afetadas:
+            parciais = _chaves_como_objeto(agregar_dados_rateio(_subconjunto(dados, afetadas), progress_callback))
+            dfs = mesclar_agregados(estado['agregados'], parciais, afetadas)
+        else:
+            dfs = estado['agregados']
+
+        if verificar:
+            progress_callback.emit("Verificando o resultado incremental contra o recálculo completo...")
+            completo = _chaves_como_objeto(agregar_dados_rateio(dados, progress_callback))
+            iguais, detalhe = comparar_rateios(consolidar_e_calcular_rateio(dfs), consolidar_e_calcular_rateio(completo))
+            if iguais:
+                progress_callback.emit("VERIFICAÇÃO OK: o rateio incremental é idêntico ao recálculo completo.")
+            else:
+                progress_callback.emit(f"AVISO: o rateio incremental diverge do recálculo completo ({detalhe}). Usando o recálculo completo.")
+                dfs = completo
+
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    pd.to_pickle({'assinatura': assinatura, 'impressoes': impressoes, 'agregados': dfs}, temporario)
+    os.replace(temporario, caminho)
+    return dfs
@@ -1,9 +1,29 @@
 import sys
-from PySide6.QtWidgets import QApplication
-from ui.main_window import MainWindow
+import time
+import multiprocessing
+
+INICIO = time.perf_counter()
+
+def main():
+    # Os imports do Qt ficam aqui dentro: o processo de execução (spawn) reimporta este
+    # arquivo e não precisa carregar a interface
+    tempos_importacao = []
+    inicio = time.perf_counter()
+    from PySide6.QtCore import QTimer
+    from PySide6.QtWidgets import QApplication
+    tempos_importacao.append(('PySide6', time.perf_counter() - inicio))
+    inicio = time.perf_counter()
+    from ui.main_window import MainWindow
+    tempos_importacao.append(('ui.main_window', time.perf_counter() - inicio))
 
-if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    # Timer de 0 ms: roda quando a fila de eventos esvazia, ou seja, depois do primeiro desenho da janela
+    QTimer.singleShot(0, lambda: window.on_first_paint(tempos_importacao, time.perf_counter() - INICIO))
+    sys.exit(app.exec())
+
+if __name__ == "__main__":
+    # Necessário para os processos de leitura das abas no executável gerado pelo PyInstaller
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,45 @@
+# Arquivo: tests/test_cli.py
+# Processamento em lote pelo cli.py: o resumo do lote aponta para os arquivos realmente gravados.
+import os
+import csv
+import shutil
+import pytest
+
+import cli
+from benchmarks.gerar_planilha import gerar_planilha
+from core.leitura_planilha import carregar_config
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def pasta_csv(tmp_path, monkeypatch):
+    """Pasta de trabalho com o config.ini do projeto em formato csv e uma planilha sintética pequena."""
+    shutil.copy(os.path.join(RAIZ, 'config.ini'), tmp_path / 'config.ini')
+    monkeypatch.chdir(tmp_path)
+    config = carregar_config()
+    config['Nomes_Arquivos_Saida']['formato'] = 'csv'
+    with open('config.ini', 'w', encoding='utf-8') as f:
+        config.write(f)
+    gerar_planilha(str(tmp_path / 'Planilha.xlsx'), 300, config, gerencias=5, meses=6)
+    return tmp_path
+
+
+@pytest.mark.parametrize('acao, arquivos_esperados', [('rateio', 1), ('atualizacao', 2)])
+def test_resumo_do_lote_lista_os_arquivos_csv_gravados(pasta_csv, acao, arquivos_esperados):
+    assert cli.main([acao, 'Planilha.xlsx', '--workers', '1']) == 0
+
+    pasta_saida = os.path.dirname(cli.caminho_saida(carregar_config(), acao, 'Planilha.xlsx', 'x')) or '.'
+    resumos = [nome for nome in os.listdir(pasta_saida) if nome.startswith('Resumo_Lote_')]
+    assert len(resumos) == 1
+    with open(os.path.join(pasta_saida, resumos[0]), newline='', encoding='utf-8-sig') as f:
+        linhas = list(csv.DictReader(f, delimiter=';'))
+
+    assert len(linhas) == 1
+    assert linhas[0]['sucesso'] == 'True'
+    saidas = linhas[0]['saida'].split(';')
+    # Um arquivo por aba (o rateio tem uma; a atualização, as duas abas de controle)
+    assert len(saidas) == arquivos_esperados
+    for saida in saidas:
+        assert saida.endswith('.csv')
+        assert os.path.exists(saida)
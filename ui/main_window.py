@@ -1,41 +1,77 @@
 # Arquivo: ui/main_window.py
 # VERSÃO COM ÍCONE DA APLICAÇÃO
 
-from PySide6.QtWidgets import QMainWindow, QPushButton, QVBoxLayout, QWidget, QTextEdit, QLabel, QFileDialog, QMessageBox, QHBoxLayout
+import os
+from PySide6.QtWidgets import (
+    QMainWindow, QPushButton, QVBoxLayout, QWidget, QTextEdit, QLabel, QFileDialog, QMessageBox, QHBoxLayout, QCheckBox,
+    QListWidget, QListWidgetItem, QAbstractItemView, QTableWidget, QTableWidgetItem, QHeaderView,
+)
 from PySide6.QtGui import QIcon ### NOVA LINHA ###
+from PySide6.QtCore import Qt
 
-# Importa a nova função que acabamos de criar
-from core.atualizacao_massiva import run_update_process 
-# Importa a função antiga
-from core.processamento_rateio import run_full_process
+# As tarefas rodam em um processo separado; a janela só envia a ação e as opções
+from ui.worker import Worker, CONCLUIDA, ERRO, CANCELADA
+# Só biblioteca padrão: não carrega o pandas no processo da interface
+from core.instrumentacao import resumo_medicoes
+
+NOMES_ACOES = {'rateio': 'Rateio', 'atualizacao': 'Atualização Massiva', 'combinado': 'Atualização + Rateio'}
+NOMES_STATUS = {'pendente': 'na fila', 'executando': 'em execução', CONCLUIDA: 'concluída', ERRO: 'com erro', CANCELADA: 'cancelada'}
+COLUNAS_MEDICOES = ['Etapa', 'Execuções', 'Tempo (s)', 'CPU (s)', 'Linhas (entrada → saída)', 'Memória (MB)']
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        
+
         # --- Configurações da Janela ---
         self.setWindowTitle("NEXUS - Automação de Planilhas")
-        self.setGeometry(100, 100, 600, 500)
-        
+        self.setGeometry(100, 100, 760, 820)
+
         # --- DEFINIÇÃO DO ÍCONE DA APLICAÇÃO --- ### NOVA LINHA ###
         self.setWindowIcon(QIcon("assets/app_icon.png")) ### NOVA LINHA ###
 
         # Atributos
-        self.file_path = None
-        self.worker = None
+        self.file_paths = []
+        self.tarefas = {}  # id da tarefa -> {'acao', 'arquivo', 'status', 'item', 'medicoes'}
+        self.worker = Worker(self)
 
         # Widgets
-        self.label = QLabel("1. Selecione o arquivo 'Motorola - Planilha de Controle.xlsm'")
-        self.select_button = QPushButton("Selecionar Arquivo")
+        self.label = QLabel("1. Selecione o(s) arquivo(s) 'Motorola - Planilha de Controle.xlsm'")
+        self.select_button = QPushButton("Selecionar Arquivo(s)")
         self.file_path_label = QLabel("Nenhum arquivo selecionado.")
-        
+
         self.run_rateio_button = QPushButton("2. Gerar Rateio")
         self.run_update_button = QPushButton("3. Executar Atualização Massiva")
-        
+        self.run_combined_button = QPushButton("4. Atualização + Rateio")
+
+        # Permite ignorar o cache de abas já lidas (ex.: suspeita de dados desatualizados)
+        self.cache_checkbox = QCheckBox("Usar cache de planilhas já processadas")
+        self.cache_checkbox.setChecked(True)
+        # Rateio em blocos, com memória constante, para planilhas de controle muito grandes
+        self.streaming_checkbox = QCheckBox("Modo streaming no rateio (planilhas muito grandes)")
+        # Recalcula só as gerências com linhas alteradas desde o último rateio desta planilha
+        self.incremental_checkbox = QCheckBox("Rateio incremental (reaproveita a execução anterior)")
+
+        # Fila de tarefas: cada clique em uma ação adiciona uma tarefa por arquivo selecionado
+        self.job_list = QListWidget()
+        self.job_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.cancel_button = QPushButton("Cancelar tarefa em execução")
+        self.remove_button = QPushButton("Remover selecionadas da fila")
+
         self.log_box = QTextEdit()
-        
+
+        # Resumo das medições de cada etapa (tempo, CPU, linhas e memória) da última tarefa concluída
+        self.summary_label = QLabel("Medições da última tarefa:")
+        self.summary_table = QTableWidget(0, len(COLUNAS_MEDICOES))
+        self.summary_table.setHorizontalHeaderLabels(COLUNAS_MEDICOES)
+        self.summary_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.summary_table.verticalHeader().setVisible(False)
+        self.summary_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.summary_table.setMaximumHeight(200)
+
         self.run_rateio_button.setEnabled(False)
         self.run_update_button.setEnabled(False)
+        self.run_combined_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
         self.log_box.setReadOnly(True)
 
         # Layout
@@ -43,14 +79,26 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(self.label)
         main_layout.addWidget(self.select_button)
         main_layout.addWidget(self.file_path_label)
-        
+
         button_layout = QHBoxLayout()
         button_layout.addWidget(self.run_rateio_button)
         button_layout.addWidget(self.run_update_button)
-        
+        button_layout.addWidget(self.run_combined_button)
+
         main_layout.addLayout(button_layout)
+        main_layout.addWidget(self.cache_checkbox)
+        main_layout.addWidget(self.streaming_checkbox)
+        main_layout.addWidget(self.incremental_checkbox)
+        main_layout.addWidget(QLabel("Fila de tarefas:"))
+        main_layout.addWidget(self.job_list)
+        queue_layout = QHBoxLayout()
+        queue_layout.addWidget(self.cancel_button)
+        queue_layout.addWidget(self.remove_button)
+        main_layout.addLayout(queue_layout)
         main_layout.addWidget(QLabel("Log de Processamento:"))
         main_layout.addWidget(self.log_box)
+        main_layout.addWidget(self.summary_label)
+        main_layout.addWidget(self.summary_table)
 
         central_widget = QWidget()
         central_widget.setLayout(main_layout)
@@ -60,49 +108,147 @@ class MainWindow(QMainWindow):
         self.select_button.clicked.connect(self.select_file)
         self.run_rateio_button.clicked.connect(self.start_rateio_processing)
         self.run_update_button.clicked.connect(self.start_update_processing)
+        self.run_combined_button.clicked.connect(self.start_combined_processing)
+        self.cancel_button.clicked.connect(self.worker.cancelar_atual)
+        self.remove_button.clicked.connect(self.remove_selected_jobs)
+        self.worker.tarefa_iniciada.connect(self.on_job_started)
+        self.worker.progress.connect(self.update_log)
+        self.worker.medicao.connect(self.on_measurement)
+        self.worker.tarefa_finalizada.connect(self.on_job_finished)
+        self.worker.fila_vazia.connect(self.on_queue_empty)
+        self.worker.pre_carregamento_concluido.connect(self.on_prewarm_finished)
+
+    def on_first_paint(self, tempos_importacao, segundos_ate_janela):
+        """Chamado logo depois do primeiro desenho: registra o tempo de abertura e pré-carrega o processamento."""
+        partes = ', '.join(f"{modulo}: {segundos * 1000:.0f} ms" for modulo, segundos in tempos_importacao)
+        self.log_box.append(f"Janela aberta em {segundos_ate_janela * 1000:.0f} ms (importações: {partes}).")
+        self.worker.pre_carregar()
+
+    def on_prewarm_finished(self, tempos):
+        """Tempo de importação de cada módulo no processo de execução, para acompanhar regressões."""
+        carregados = [(modulo, segundos) for modulo, segundos in tempos if segundos is not None]
+        total = sum(segundos for _, segundos in carregados)
+        partes = ', '.join(f"{modulo}: {segundos * 1000:.0f} ms" for modulo, segundos in carregados)
+        self.log_box.append(f"Processamento pré-carregado em segundo plano em {total * 1000:.0f} ms ({partes}).")
 
     def select_file(self):
-        file_path_tuple = QFileDialog.getOpenFileName(self, "Selecionar Planilha", "", "Arquivos Excel (*.xlsm *.xlsx)")
-        file_path = file_path_tuple[0]
-        if file_path:
-            self.file_path = file_path
-            self.file_path_label.setText(f"Arquivo: {self.file_path.split('/')[-1]}")
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Selecionar Planilha(s)", "", "Arquivos Excel (*.xlsm *.xlsx)")
+        if file_paths:
+            self.file_paths = file_paths
+            if len(file_paths) == 1:
+                self.file_path_label.setText(f"Arquivo: {os.path.basename(file_paths[0])}")
+            else:
+                self.file_path_label.setText(f"{len(file_paths)} arquivos selecionados.")
             self.run_rateio_button.setEnabled(True)
             self.run_update_button.setEnabled(True)
-            self.log_box.setText("Arquivo selecionado. Escolha uma ação.")
+            self.run_combined_button.setEnabled(True)
 
     def start_rateio_processing(self):
-        self.start_processing(run_full_process)
+        self.enqueue('rateio', {
+            'usar_cache': self.cache_checkbox.isChecked(),
+            'modo_streaming': self.streaming_checkbox.isChecked(),
+            'incremental': self.incremental_checkbox.isChecked(),
+        })
 
     def start_update_processing(self):
-        self.start_processing(run_update_process)
+        self.enqueue('atualizacao', {'usar_cache': self.cache_checkbox.isChecked()})
+
+    def start_combined_processing(self):
+        self.enqueue('combinado', {'usar_cache': self.cache_checkbox.isChecked()})
 
-    def start_processing(self, target_function):
-        from ui.worker import Worker
-        if not self.file_path:
+    def enqueue(self, acao, opcoes):
+        """Adiciona à fila uma tarefa por arquivo selecionado. A janela continua livre para novas tarefas."""
+        if not self.file_paths:
             QMessageBox.warning(self, "Aviso", "Por favor, selecione um arquivo primeiro.")
             return
-            
-        self._toggle_buttons(False)
-        self.log_box.clear()
-        
-        self.worker = Worker(file_path=self.file_path, target_function=target_function)
-        self.worker.progress.connect(self.update_log)
-        self.worker.finished.connect(self.on_processing_finished)
-        self.worker.start()
+        for file_path in self.file_paths:
+            item = QListWidgetItem()
+            self.job_list.addItem(item)
+            id_tarefa = self.worker.adicionar(acao, file_path, opcoes)
+            self.tarefas[id_tarefa] = {'acao': acao, 'arquivo': file_path, 'status': 'pendente', 'item': item, 'medicoes': []}
+            item.setData(Qt.UserRole, id_tarefa)
+            self._refresh_item(id_tarefa)
+
+    def remove_selected_jobs(self):
+        for item in self.job_list.selectedItems():
+            id_tarefa = item.data(Qt.UserRole)
+            if self.worker.remover(id_tarefa):
+                self.job_list.takeItem(self.job_list.row(item))
+                del self.tarefas[id_tarefa]
+
+    def _refresh_item(self, id_tarefa):
+        tarefa = self.tarefas[id_tarefa]
+        tarefa['item'].setText(f"{NOMES_ACOES[tarefa['acao']]} - {os.path.basename(tarefa['arquivo'])}: {NOMES_STATUS[tarefa['status']]}")
+
+    def _set_status(self, id_tarefa, status):
+        if id_tarefa in self.tarefas:
+            self.tarefas[id_tarefa]['status'] = status
+            self._refresh_item(id_tarefa)
+
+    def on_job_started(self, id_tarefa):
+        self._set_status(id_tarefa, 'executando')
+        self.cancel_button.setEnabled(True)
+        tarefa = self.tarefas.get(id_tarefa)
+        if tarefa is not None:
+            self.log_box.append(f"\n===== {NOMES_ACOES[tarefa['acao']]}: {os.path.basename(tarefa['arquivo'])} =====")
 
-    def update_log(self, message):
+    def update_log(self, id_tarefa, message):
         self.log_box.append(message)
-        
-    def _toggle_buttons(self, enabled):
-        """Função auxiliar para habilitar/desabilitar botões."""
-        self.select_button.setEnabled(enabled)
-        self.run_rateio_button.setEnabled(enabled)
-        self.run_update_button.setEnabled(enabled)
-
-    def on_processing_finished(self, success):
-        self._toggle_buttons(True)
-        if success:
+
+    def on_measurement(self, id_tarefa, evento):
+        if id_tarefa in self.tarefas:
+            self.tarefas[id_tarefa]['medicoes'].append(evento)
+
+    def on_job_finished(self, id_tarefa, status):
+        self._set_status(id_tarefa, status)
+        self.cancel_button.setEnabled(False)
+        if status == CANCELADA:
+            self.log_box.append("TAREFA CANCELADA pelo usuário.")
+        elif id_tarefa in self.tarefas:
+            self.show_summary(id_tarefa)
+
+    def show_summary(self, id_tarefa):
+        """Preenche a tabela de medições: uma linha por etapa, indentada conforme o aninhamento."""
+        tarefa = self.tarefas[id_tarefa]
+        linhas = resumo_medicoes(tarefa['medicoes'])
+        self.summary_label.setText(f"Medições: {NOMES_ACOES[tarefa['acao']]} - {os.path.basename(tarefa['arquivo'])}")
+        self.summary_table.setRowCount(len(linhas))
+        for i, linha in enumerate(linhas):
+            if linha['linhas_entrada'] is None and linha['linhas_saida'] is None:
+                texto_linhas = ''
+            else:
+                texto_linhas = f"{linha['linhas_entrada'] if linha['linhas_entrada'] is not None else '-'} → {linha['linhas_saida'] if linha['linhas_saida'] is not None else '-'}"
+            valores = [
+                '    ' * linha['nivel'] + linha['nome'],
+                str(linha['execucoes']),
+                f"{linha['segundos']:.2f}",
+                f"{linha['cpu_segundos']:.2f}",
+                texto_linhas,
+                f"{linha['memoria_mb']:+.1f}" if linha['memoria_mb'] is not None else '',
+            ]
+            for coluna, valor in enumerate(valores):
+                item = QTableWidgetItem(valor)
+                if coluna > 0:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.summary_table.setItem(i, coluna, item)
+        self.summary_table.resizeColumnsToContents()
+
+    def on_queue_empty(self):
+        """Um único aviso ao final da fila, em vez de um pop-up por tarefa."""
+        finalizadas = [t for t in self.tarefas.values() if t['status'] in (CONCLUIDA, ERRO, CANCELADA)]
+        if not finalizadas:
+            return
+        erros = sum(1 for t in finalizadas if t['status'] == ERRO)
+        concluidas = sum(1 for t in finalizadas if t['status'] == CONCLUIDA)
+        # As tarefas já informadas não entram no próximo resumo
+        for id_tarefa in [i for i, t in self.tarefas.items() if t in finalizadas]:
+            del self.tarefas[id_tarefa]
+        if erros:
+            QMessageBox.critical(self, "Erro", f"{concluidas} tarefa(s) concluída(s) e {erros} com erro. Verifique o log para mais detalhes.")
+        elif concluidas:
             QMessageBox.information(self, "Processo Concluído", "A operação foi finalizada com sucesso! Verifique o log e os arquivos gerados.")
-        else:
-            QMessageBox.critical(self, "Erro", "Ocorreu um erro durante o processamento. Verifique o log para mais detalhes.")
\ No newline at end of file
+
+    def closeEvent(self, event):
+        # Encerra o processo de execução junto com a janela
+        self.worker.encerrar()
+        super().closeEvent(event)
@@ -0,0 +1,105 @@
+# Arquivo: ui/processo_worker.py
+# Lado do processo filho do worker da interface. Não importa o Qt: o processo só carrega
+# pandas/openpyxl e executa as tarefas que chegam pelo pipe de comandos, uma de cada vez.
+import os
+import time
+import queue
+import importlib
+import threading
+import traceback
+import multiprocessing
+
+# Módulos carregados logo que o processo sobe, enquanto o usuário ainda escolhe o arquivo.
+# Dependências vêm antes de quem as usa, para o tempo de cada um não incluir o das outras.
+MODULOS_PRE_CARREGADOS = [
+    'numpy', 'pandas', 'openpyxl', 'xlsxwriter', 'pyarrow',
+    'core.leitura_planilha', 'core.cache_planilha', 'core.executor_dag', 'core.exportacao',
+    'core.processamento_rateio', 'core.atualizacao_massiva', 'core.processo_combinado',
+]
+
+
+def _funcao_da_acao(acao):
+    if acao == 'rateio':
+        from core.processamento_rateio import run_full_process
+        return run_full_process
+    if acao == 'atualizacao':
+        from core.atualizacao_massiva import run_update_process
+        return run_update_process
+    if acao == 'combinado':
+        from core.processo_combinado import run_combined_process
+        return run_combined_process
+    raise ValueError(f"Ação desconhecida: '{acao}'.")
+
+
+def pre_carregar_modulos(modulos=MODULOS_PRE_CARREGADOS):
+    """Importa os módulos e devolve [(módulo, segundos)]. Módulos opcionais ausentes ficam com None."""
+    tempos = []
+    for modulo in modulos:
+        inicio = time.perf_counter()
+        try:
+            importlib.import_module(modulo)
+        except ImportError:
+            tempos.append((modulo, None))
+            continue
+        tempos.append((modulo, time.perf_counter() - inicio))
+    return tempos
+
+
+class ProgressoPipe:
+    """Substitui o Signal do Qt no processo filho: mesma interface emit(), enviando pelo pipe."""
+
+    def __init__(self, conexao, id_tarefa):
+        self.conexao = conexao
+        self.id_tarefa = id_tarefa
+
+    def emit(self, message):
+        self.conexao.send(('progresso', self.id_tarefa, str(message)))
+
+    def evento(self, dados):
+        """Medição estruturada de uma etapa (core/instrumentacao.py), enviada junto com o log."""
+        self.conexao.send(('medicao', self.id_tarefa, dados))
+
+
+def _encerrar_imediatamente():
+    # Encerra também os processos criados pela tarefa (ex.: leitura das abas em paralelo)
+    for filho in multiprocessing.active_children():
+        filho.terminate()
+    os._exit(0)
+
+
+def executar_worker(comandos, eventos):
+    """
+    Laço principal do processo filho. Comandos recebidos:
+      ('pre_carregar',) -> importa os módulos pesados e responde ('pre_carregamento', None, tempos);
+      ('tarefa', id, acao, file_path, opcoes) -> executa e responde ('inicio', id) e ('fim', id, sucesso),
+          com ('progresso', id, texto) e ('medicao', id, evento) durante a execução;
+      ('cancelar',) ou ('encerrar',) -> encerra o processo na hora, mesmo no meio de uma tarefa.
+    Os comandos são lidos por uma thread própria, então o cancelamento não espera a tarefa.
+    """
+    tarefas = queue.Queue()
+
+    def escutar():
+        while True:
+            try:
+                comando = comandos.recv()
+            except (EOFError, OSError):
+                # A interface foi fechada
+                _encerrar_imediatamente()
+            if comando[0] in ('cancelar', 'encerrar'):
+                _encerrar_imediatamente()
+            tarefas.put(comando)
+
+    threading.Thread(target=escutar, daemon=True).start()
+    while True:
+        comando = tarefas.get()
+        if comando[0] == 'pre_carregar':
+            eventos.send(('pre_carregamento', None, pre_carregar_modulos()))
+            continue
+        _, id_tarefa, acao, file_path, opcoes = comando
+        eventos.send(('inicio', id_tarefa))
+        try:
+            sucesso = bool(_funcao_da_acao(acao)(file_path, ProgressoPipe(eventos, id_tarefa), **opcoes))
+        except Exception:
+            eventos.send(('progresso', id_tarefa, f"\nERRO INESPERADO NO WORKER:\n{traceback.format_exc()}"))
+            sucesso = False
+        eventos.send(('fim', id_tarefa, sucesso))
@@ -1,16 +1,162 @@
 # Arquivo: ui/worker.py
-from PySide6.QtCore import QThread, Signal
+# Executa as tarefas fora do processo da interface: o pandas/openpyxl roda em um processo
+# filho de longa duração (ui/processo_worker.py) e o progresso volta por um pipe, lido por
+# um QTimer. A interface nunca disputa o GIL com o processamento.
+import itertools
+import multiprocessing
+from collections import deque
+from PySide6.QtCore import QObject, QTimer, Signal
+from ui.processo_worker import executar_worker
 
-class Worker(QThread):
-    progress = Signal(str)
-    finished = Signal(bool)
+INTERVALO_LEITURA_MS = 30
+# Limita o trabalho por ciclo do timer: rajadas de mensagens não congelam a janela
+MAX_EVENTOS_POR_CICLO = 200
 
-    def __init__(self, file_path, target_function):
-        super().__init__()
-        self.file_path = file_path
-        self.target_function = target_function # Armazena a função que deve ser executada
+CONCLUIDA = 'concluida'
+ERRO = 'erro'
+CANCELADA = 'cancelada'
 
-    def run(self):
-        # Executa a função que foi passada durante a criação
-        success = self.target_function(self.file_path, self.progress)
-        self.finished.emit(success)
\ No newline at end of file
+
+class Worker(QObject):
+    """Fila de tarefas executadas uma por vez no processo filho, com cancelamento."""
+    tarefa_iniciada = Signal(int)
+    progress = Signal(int, str)
+    medicao = Signal(int, object)
+    tarefa_finalizada = Signal(int, str)
+    fila_vazia = Signal()
+    pre_carregamento_concluido = Signal(list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # 'spawn' em todas as plataformas: fork de um processo com Qt não é seguro
+        self._contexto = multiprocessing.get_context('spawn')
+        self._processo = None
+        self._comandos = None
+        self._eventos = None
+        self._pendentes = deque()
+        self._atual = None
+        self._ids = itertools.count(1)
+        self._timer = QTimer(self)
+        self._timer.setInterval(INTERVALO_LEITURA_MS)
+        self._timer.timeout.connect(self._ler_eventos)
+
+    @property
+    def tarefa_atual(self):
+        return self._atual
+
+    def adicionar(self, acao, file_path, opcoes=None):
+        """Coloca uma tarefa na fila e devolve o seu id. `opcoes` vai como kwargs para a função da ação."""
+        id_tarefa = next(self._ids)
+        self._pendentes.append((id_tarefa, acao, file_path, dict(opcoes or {})))
+        self._avancar()
+        return id_tarefa
+
+    def remover(self, id_tarefa):
+        """Tira da fila uma tarefa que ainda não começou. Retorna False se ela já começou ou não existe."""
+        for tarefa in self._pendentes:
+            if tarefa[0] == id_tarefa:
+                self._pendentes.remove(tarefa)
+                return True
+        return False
+
+    def pre_carregar(self):
+        """
+        Sobe o processo filho antes da primeira tarefa e importa nele pandas, openpyxl etc.
+        Chamado depois que a janela aparece: o primeiro clique já encontra tudo carregado.
+        """
+        if self._processo is None:
+            self._iniciar_processo()
+        self._comandos.send(('pre_carregar',))
+
+    def cancelar_atual(self):
+        """Interrompe a tarefa em execução encerrando o processo filho (recriado para a próxima)."""
+        if self._atual is None:
+            return
+        id_tarefa, self._atual = self._atual, None
+        self._parar_processo()
+        self.tarefa_finalizada.emit(id_tarefa, CANCELADA)
+        self._avancar()
+
+    def encerrar(self):
+        """Descarta a fila e encerra o processo filho (ao fechar a janela)."""
+        self._pendentes.clear()
+        self._atual = None
+        self._parar_processo()
+
+    def _iniciar_processo(self):
+        comandos_leitura, self._comandos = self._contexto.Pipe(duplex=False)
+        self._eventos, eventos_escrita = self._contexto.Pipe(duplex=False)
+        self._processo = self._contexto.Process(target=executar_worker, args=(comandos_leitura, eventos_escrita), name='nexus-worker')
+        self._processo.start()
+        # As pontas do filho ficam só com ele: assim a queda do filho aparece como EOF no pipe
+        comandos_leitura.close()
+        eventos_escrita.close()
+        self._timer.start()
+
+    def _parar_processo(self):
+        if self._processo is None:
+            return
+        self._timer.stop()
+        try:
+            self._comandos.send(('cancelar',))
+        except OSError:
+            pass
+        self._processo.join(1.0)
+        if self._processo.is_alive():
+            # O filho não respondeu a tempo (ex.: uma operação longa segurando o GIL)
+            self._processo.terminate()
+            self._processo.join(1.0)
+        if self._processo.is_alive():
+            self._processo.kill()
+            self._processo.join()
+        self._comandos.close()
+        self._eventos.close()
+        self._processo = self._comandos = self._eventos = None
+
+    def _avancar(self):
+        if self._atual is not None:
+            return
+        if not self._pendentes:
+            self.fila_vazia.emit()
+            return
+        if self._processo is None:
+            self._iniciar_processo()
+        id_tarefa, acao, file_path, opcoes = self._pendentes.popleft()
+        self._atual = id_tarefa
+        self._comandos.send(('tarefa', id_tarefa, acao, file_path, opcoes))
+
+    def _ler_eventos(self):
+        for _ in range(MAX_EVENTOS_POR_CICLO):
+            try:
+                if not self._eventos.poll():
+                    return
+                evento = self._eventos.recv()
+            except (EOFError, OSError):
+                self._processo_encerrado()
+                return
+            tipo, id_tarefa = evento[0], evento[1]
+            if tipo == 'pre_carregamento':
+                self.pre_carregamento_concluido.emit(evento[2])
+                continue
+            if id_tarefa != self._atual:
+                continue
+            if tipo == 'inicio':
+                self.tarefa_iniciada.emit(id_tarefa)
+            elif tipo == 'progresso':
+                self.progress.emit(id_tarefa, evento[2])
+            elif tipo == 'medicao':
+                self.medicao.emit(id_tarefa, evento[2])
+            elif tipo == 'fim':
+                self._atual = None
+                self.tarefa_finalizada.emit(id_tarefa, CONCLUIDA if evento[2] else ERRO)
+                self._avancar()
+                return
+
+    def _processo_encerrado(self):
+        """O processo filho morreu sozinho (ex.: falta de memória): a tarefa atual falha."""
+        id_tarefa, self._atual = self._atual, None
+        self._parar_processo()
+        if id_tarefa is not None:
+            self.progress.emit(id_tarefa, "\nERRO: o processo de execução foi encerrado inesperadamente.")
+            self.tarefa_finalizada.emit(id_tarefa, ERRO)
+            self._avancar()